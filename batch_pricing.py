@@ -0,0 +1,276 @@
+# ======================================================
+# SMART CAR PRICING SYSTEM - BATCH VALUATION
+# ======================================================
+#
+# Offline re-pricing of a whole listings file on every core:
+#
+#   python batch_pricing.py stock.csv priced.csv --intervals
+#   python batch_pricing.py stock.parquet priced.parquet --workers 16
+#   python batch_pricing.py stock.csv priced.csv --resume    # after an interruption
+#
+# The input is cut into fixed-size shards priced by a process pool, each
+# worker loading the saved model once. Only plain arrays are memory-mapped
+# and shared between workers (a compacted forest, aggregates, the surface);
+# a scikit-learn forest copies its trees into every worker, so compact big
+# forests before large runs. Shards are written in input order with only
+# a few in flight, so memory stays bounded whatever the file size. A
+# checkpoint next to the output records every written shard, and --resume
+# continues after the last.
+#
+# CSV output is one file. Parquet output is a dataset directory with one
+# part file per shard, readable with pd.read_parquet(directory).
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from pricing_core import (
+    CarPricePredictor, CSV_DTYPES, MODEL_STORE_DIR, coerce_csv_numbers, read_latest_model_version, file_digest
+)
+
+BATCH_SHARD_ROWS = 100000
+# Shards queued per worker, bounds memory while keeping every worker busy
+SHARDS_IN_FLIGHT_PER_WORKER = 2
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+PROGRESS_INTERVAL_SECONDS = 10
+
+# ========================================
+# WORKERS
+# ========================================
+
+# This worker process's predictor, loaded once by init_worker
+worker_predictor = None
+
+def init_worker(version, store_dir):
+    """Load the model once per worker, single-threaded since the pool already uses every core"""
+    global worker_predictor
+    from threadpoolctl import threadpool_limits
+
+    threadpool_limits(limits=1)
+    if version is None:
+        worker_predictor = CarPricePredictor()
+        return
+    worker_predictor = CarPricePredictor.load_model(version, store_dir)
+    if hasattr(worker_predictor.model, 'n_jobs'):
+        worker_predictor.model.n_jobs = 1
+
+def price_shard(shard, intervals):
+    """Price one shard in a worker, returns only the price columns"""
+    prices = worker_predictor.predict_batch(shard, return_interval=intervals)
+    if intervals:
+        return prices.reset_index(drop=True)
+    return pd.DataFrame({'Predicted_Price': prices})
+
+# ========================================
+# SHARD INPUT
+# ========================================
+
+def read_shards(path, shard_rows=BATCH_SHARD_ROWS, skip_rows=0):
+    """Yield consecutive shard_rows-row frames of a CSV or Parquet file, starting after skip_rows rows"""
+    if path.lower().endswith('.parquet'):
+        yield from parquet_shards(path, shard_rows, skip_rows)
+        return
+
+    # Skipped rows are still tokenized but never converted
+    reader = pd.read_csv(path, chunksize=shard_rows, dtype=CSV_DTYPES,
+                         skiprows=range(1, skip_rows + 1) if skip_rows else None)
+    for shard in reader:
+        yield coerce_csv_numbers(shard).reset_index(drop=True)
+
+def parquet_shards(path, shard_rows, skip_rows):
+    """Re-cut a Parquet file's record batches into exact shard_rows-row frames"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    buffered = []
+    buffered_rows = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=shard_rows):
+        if skip_rows >= batch.num_rows:
+            skip_rows -= batch.num_rows
+            continue
+        batch = batch.slice(skip_rows)
+        skip_rows = 0
+
+        buffered.append(batch)
+        buffered_rows += batch.num_rows
+        while buffered_rows >= shard_rows:
+            table = pa.Table.from_batches(buffered)
+            yield table.slice(0, shard_rows).to_pandas()
+            rest = table.slice(shard_rows)
+            buffered = rest.to_batches()
+            buffered_rows = rest.num_rows
+
+    if buffered_rows:
+        yield pa.Table.from_batches(buffered).to_pandas()
+
+# ========================================
+# ORDERED OUTPUT
+# ========================================
+
+class CsvShardWriter:
+    """Appends priced shards to one CSV file, truncating anything written after the checkpoint"""
+
+    def __init__(self, path, output_bytes=0):
+        if output_bytes:
+            self.file = open(path, 'r+b')
+            self.file.truncate(output_bytes)
+            self.file.seek(output_bytes)
+        else:
+            self.file = open(path, 'wb')
+        self.header = output_bytes == 0
+
+    def write(self, priced, shard_number):
+        """Write one shard, returns the output size so far"""
+        priced.to_csv(self.file, header=self.header, index=False)
+        self.header = False
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+class ParquetShardWriter:
+    """Writes each priced shard as its own part file of a Parquet dataset directory"""
+
+    def __init__(self, path, shards_done=0):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        # Parts past the checkpoint are from an interrupted run
+        for name in os.listdir(path):
+            if name.endswith('.tmp') or (name.startswith("part-") and int(name[5:11]) >= shards_done):
+                os.remove(os.path.join(path, name))
+
+    def write(self, priced, shard_number):
+        """Write one shard atomically, returns the dataset size so far"""
+        part_path = os.path.join(self.path, f"part-{shard_number:06d}.parquet")
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        os.close(fd)
+        priced.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, part_path)
+        return sum(entry.stat().st_size for entry in os.scandir(self.path) if entry.name.startswith("part-"))
+
+    def close(self):
+        pass
+
+def save_checkpoint(checkpoint, path):
+    """Atomically write the checkpoint"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+# ========================================
+# BATCH JOB
+# ========================================
+
+def run_batch(input_path, output_path, workers=os.cpu_count(), shard_rows=BATCH_SHARD_ROWS, intervals=False,
+              resume=False, store_dir=MODEL_STORE_DIR, log=print):
+    """Price every row of input_path into output_path on a process pool, returns a run summary"""
+    checkpoint_path = output_path.rstrip(os.sep) + CHECKPOINT_SUFFIX
+    job = {
+        'input': os.path.abspath(input_path),
+        'input_digest': file_digest(input_path),
+        'shard_rows': shard_rows,
+        'intervals': intervals
+    }
+    checkpoint = {**job, 'model_version': read_latest_model_version(store_dir),
+                  'shards_done': 0, 'rows_done': 0, 'output_bytes': 0, 'complete': False}
+
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            saved = json.load(f)
+        mismatched = [key for key in job if saved.get(key) != job[key]]
+        if mismatched:
+            raise ValueError(f"Checkpoint {checkpoint_path} is for a different job ({', '.join(mismatched)} "
+                             f"changed), rerun without --resume")
+        # Finish with the model the job started with, even if a newer one was saved since
+        checkpoint = saved
+        if checkpoint['complete']:
+            log(f"✅ Already complete: {checkpoint['rows_done']:,} rows in {output_path}")
+            return {'rows': 0, 'seconds': 0.0, 'rows_per_second': 0.0, 'model_version': checkpoint['model_version']}
+        log(f"↩️ Resuming after {checkpoint['rows_done']:,} rows ({checkpoint['shards_done']} shards)")
+
+    if output_path.lower().endswith('.parquet'):
+        writer = ParquetShardWriter(output_path, checkpoint['shards_done'])
+    else:
+        writer = CsvShardWriter(output_path, checkpoint['output_bytes'])
+    save_checkpoint(checkpoint, checkpoint_path)
+    log(f"💰 Pricing {input_path} with {workers} workers, model {checkpoint['model_version'] or 'fallback'}")
+
+    start = time.perf_counter()
+    last_report = start
+    rows = 0
+    pending = deque()
+
+    def write_next():
+        nonlocal rows, last_report
+        shard, future = pending.popleft()
+        first_row = checkpoint['rows_done']
+        try:
+            prices = future.result()
+        except ValueError as e:
+            raise ValueError(f"Rows {first_row:,}-{first_row + len(shard) - 1:,}: {str(e)}") from e
+
+        # Bulk pricing layout: the listing columns followed by its prices
+        checkpoint['output_bytes'] = writer.write(shard.join(prices), checkpoint['shards_done'])
+        checkpoint['shards_done'] += 1
+        checkpoint['rows_done'] += len(shard)
+        save_checkpoint(checkpoint, checkpoint_path)
+
+        rows += len(shard)
+        now = time.perf_counter()
+        if now - last_report >= PROGRESS_INTERVAL_SECONDS:
+            log(f"⏱️ {checkpoint['rows_done']:,} rows, {rows / (now - start):,.0f} rows/sec")
+            last_report = now
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                               initargs=(checkpoint['model_version'], store_dir))
+    try:
+        for shard in read_shards(input_path, shard_rows, checkpoint['rows_done']):
+            pending.append((shard, pool.submit(price_shard, shard, intervals)))
+            if len(pending) >= workers * SHARDS_IN_FLIGHT_PER_WORKER:
+                write_next()
+        while pending:
+            write_next()
+    finally:
+        # On errors and Ctrl+C, drop queued shards instead of pricing them
+        pool.shutdown(wait=True, cancel_futures=True)
+        writer.close()
+
+    checkpoint['complete'] = True
+    save_checkpoint(checkpoint, checkpoint_path)
+
+    seconds = time.perf_counter() - start
+    summary = {
+        'rows': rows,
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds > 0 else 0.0,
+        'model_version': checkpoint['model_version']
+    }
+    log(f"✅ Priced {rows:,} rows in {seconds:.1f}s ({summary['rows_per_second']:,.0f} rows/sec) "
+        f"-> {output_path}")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Price a CSV or Parquet file of listings on every core")
+    parser.add_argument("input", help="listings CSV or Parquet file")
+    parser.add_argument("output", help="priced CSV file, or Parquet dataset directory if it ends in .parquet")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--shard-rows", type=int, default=BATCH_SHARD_ROWS)
+    parser.add_argument("--intervals", action="store_true", help="add low / median / high price columns")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted run from its checkpoint")
+    parser.add_argument("--model-dir", default=MODEL_STORE_DIR)
+    args = parser.parse_args()
+
+    run_batch(args.input, args.output, workers=args.workers, shard_rows=args.shard_rows,
+              intervals=args.intervals, resume=args.resume, store_dir=args.model_dir)
+
+if __name__ == "__main__":
+    main()
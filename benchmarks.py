@@ -0,0 +1,312 @@
+# ======================================================
+# SMART CAR PRICING SYSTEM - BENCHMARK SUITE
+# ======================================================
+#
+# Headless timings of the pricing hot paths on synthetic listings.
+#
+#   python benchmarks.py                              # 1k / 100k / 1M rows
+#   python benchmarks.py --quick                      # small smoke run
+#   python benchmarks.py --compare old_results.json   # flag regressions
+
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from pricing_core import (
+    CarPricePredictor, SPEC_CATALOG, MARKET_PRICE_TABLE, get_market_price_index, compare_backends,
+    FUEL_TYPES, TRANSMISSIONS, CAR_CONDITIONS, CONDITION_MULTIPLIER_ARRAY, CITIES
+)
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+QUICK_SIZES = [1000, 10000]
+DEFAULT_OUTPUT = "benchmark_results.json"
+LATENCY_SAMPLES = 1000
+COMPARE_CARS = 50
+REGRESSION_THRESHOLD = 0.2
+
+# ========================================
+# SYNTHETIC LISTINGS
+# ========================================
+
+def generate_listings(n_rows, seed=42):
+    """Sample synthetic listings from the car database with a plausible price"""
+    rng = np.random.default_rng(seed)
+    current_year = datetime.now().year
+
+    rows = rng.integers(0, len(SPEC_CATALOG), n_rows)
+    brand = np.asarray(SPEC_CATALOG.brand)[rows]
+    model = SPEC_CATALOG.model[rows]
+    year = rng.integers(current_year - 15, current_year + 1, n_rows)
+    mileage = np.clip(rng.normal((current_year - year) * 12000, 15000), 0, 500000).astype(np.int64)
+    condition = rng.integers(0, len(CAR_CONDITIONS), n_rows)
+
+    # Market average, depreciated by age, adjusted for condition and mileage, plus noise
+    market_rows = get_market_price_index().get_indexer(pd.MultiIndex.from_arrays([brand, model]))
+    base_price = MARKET_PRICE_TABLE[market_rows, 1]
+    age_factor = np.maximum(0.3, 1 - (current_year - year) * 0.08)
+    price = (base_price * age_factor * CONDITION_MULTIPLIER_ARRAY[condition]
+             - mileage * 0.5) * rng.normal(1.0, 0.08, n_rows)
+
+    return pd.DataFrame({
+        'Brand': brand,
+        'Model': model,
+        'Year': year,
+        'Fuel_Type': rng.choice(FUEL_TYPES, n_rows),
+        'Transmission': rng.choice(TRANSMISSIONS, n_rows),
+        'Mileage': mileage,
+        'Engine_cc': SPEC_CATALOG.engine_cc[rows],
+        'Power_HP': SPEC_CATALOG.power_hp[rows],
+        'Condition': np.asarray(CAR_CONDITIONS)[condition],
+        'Registration_City': rng.choice(CITIES, n_rows),
+        'Price': np.maximum(50000, price).round()
+    })
+
+# ========================================
+# MEASUREMENT HELPERS
+# ========================================
+
+def measure(fn):
+    """Run fn once, returns (result, wall seconds, peak traced bytes)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn()
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+def latency_stats(fn, items):
+    """Time fn on each item, returns p50/p99/mean latency in milliseconds"""
+    timings = np.empty(len(items))
+    for i, item in enumerate(items):
+        start = time.perf_counter()
+        fn(item)
+        timings[i] = time.perf_counter() - start
+    timings *= 1000
+    return {
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p99_ms': float(np.percentile(timings, 99)),
+        'mean_ms': float(timings.mean()),
+        'samples': len(items)
+    }
+
+# ========================================
+# BENCHMARKS
+# ========================================
+
+def bench_single_latency(predictor, listings, name):
+    """Single-row predict_price latency"""
+    cars = listings.head(LATENCY_SAMPLES).to_dict('records')
+    return {'benchmark': name, 'rows': 1, **latency_stats(predictor.predict_price, cars)}
+
+def bench_fallback_latency(predictor, listings):
+    """Single-row fallback_prediction latency"""
+    cars = listings.head(LATENCY_SAMPLES).to_dict('records')
+    return {'benchmark': "fallback_prediction", 'rows': 1,
+            **latency_stats(predictor.fallback_prediction, cars)}
+
+def bench_batch(predictor, listings, name):
+    """Bulk predict_batch throughput"""
+    _, seconds, peak = measure(lambda: predictor.predict_batch(listings))
+    return {
+        'benchmark': name,
+        'rows': len(listings),
+        'seconds': seconds,
+        'rows_per_second': len(listings) / seconds,
+        'peak_memory_bytes': peak
+    }
+
+def bench_training(listings, n_jobs):
+    """fit_model wall time for a given number of cores"""
+    predictor = CarPricePredictor()
+    metrics, seconds, peak = measure(lambda: predictor.fit_model(listings, n_jobs=n_jobs))
+    return {
+        'benchmark': "train_from_csv",
+        'rows': len(listings),
+        'n_jobs': n_jobs,
+        'seconds': seconds,
+        'rows_per_second': len(listings) / seconds,
+        'peak_memory_bytes': peak,
+        'train_r2': metrics['r2']
+    }
+
+def bench_ingestion(listings, work_dir):
+    """CSV load through plain read_csv and through streaming ingestion"""
+    csv_path = os.path.join(work_dir, f"listings_{len(listings)}.csv")
+    listings.to_csv(csv_path, index=False)
+    predictor = CarPricePredictor()
+
+    results = []
+    for name, load in [
+        ("load_csv_data", lambda: predictor.load_csv(csv_path)[0]),
+        ("load_csv_data_streaming", lambda: predictor.ingest_csv(csv_path, cache_dir=None)[0])
+    ]:
+        df, seconds, peak = measure(load)
+        results.append({
+            'benchmark': name,
+            'rows': len(listings),
+            'seconds': seconds,
+            'rows_per_second': len(listings) / seconds,
+            'peak_memory_bytes': peak,
+            'frame_bytes': int(df.memory_usage(deep=True).sum())
+        })
+    os.remove(csv_path)
+    return results
+
+def bench_compare(predictor, listings):
+    """Batched compare_cars: spec enrichment, one predict and market price lookup"""
+    cars = listings.head(COMPARE_CARS)[['Brand', 'Model', 'Year', 'Condition', 'Mileage']]
+    _, seconds, peak = measure(lambda: predictor.compare_cars(cars))
+    return {
+        'benchmark': "compare_cars",
+        'rows': len(cars),
+        'seconds': seconds,
+        'rows_per_second': len(cars) / seconds,
+        'peak_memory_bytes': peak
+    }
+
+def run_benchmarks(sizes, train_sizes, core_counts, log=print):
+    """Run the full suite, returns a list of result records"""
+    results = []
+
+    def record(result):
+        results.append(result)
+        log(json.dumps(result))
+
+    # Untrained fallback path
+    fallback = CarPricePredictor()
+    sample = generate_listings(LATENCY_SAMPLES, seed=1)
+    record(bench_fallback_latency(fallback, sample))
+    record(bench_single_latency(fallback, sample, "predict_price_fallback"))
+
+    # Training wall time versus rows and cores
+    for n_rows in train_sizes:
+        listings = generate_listings(n_rows)
+        for n_jobs in core_counts:
+            record(bench_training(listings, n_jobs))
+
+    # Trained model hot paths
+    predictor = CarPricePredictor()
+    predictor.fit_model(generate_listings(min(train_sizes)), n_jobs=-1)
+    record(bench_single_latency(predictor, sample, "predict_price"))
+    record(bench_compare(predictor, sample))
+
+    # Single-car lookups in the precomputed depreciation surface, as used by depreciation curves
+    surface_predictor = copy.copy(predictor)
+    _, seconds, peak = measure(surface_predictor.precompute_surface)
+    record({'benchmark': "precompute_surface", 'rows': int(surface_predictor.surface.values[..., 0].size),
+            'seconds': seconds, 'peak_memory_bytes': peak})
+    # The grid holds listings without a known city
+    cars = sample.drop(columns='Registration_City').head(LATENCY_SAMPLES).to_dict('records')
+    record({'benchmark': "surface_value", 'rows': 1, **latency_stats(surface_predictor.surface.value, cars)})
+
+    # Every model backend on the same data: fit time, throughput, size and accuracy
+    for report in compare_backends(generate_listings(max(train_sizes)), n_jobs=-1):
+        record({
+            'benchmark': f"backend_report_{report['backend']}",
+            'rows': report['training_rows'],
+            'seconds': report['fit_seconds'],
+            'predict_rows_per_second': report['predict_rows_per_second'],
+            'model_bytes': report['model_bytes'],
+            'r2': report['r2'],
+            'mae': report['mae']
+        })
+
+    # The same forest flattened into compact node arrays
+    compact_predictor = copy.copy(predictor)
+    stats, seconds, peak = measure(compact_predictor.compact_model)
+    record({'benchmark': "compact_model", 'rows': stats['nodes_after'], 'seconds': seconds,
+            'model_bytes_before': stats['bytes_before'], 'model_bytes': stats['bytes_after'],
+            'peak_memory_bytes': peak})
+    record(bench_single_latency(compact_predictor, sample, "predict_price_compact"))
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for n_rows in sizes:
+            listings = generate_listings(n_rows)
+            record(bench_batch(predictor, listings, "predict_batch"))
+            record(bench_batch(compact_predictor, listings, "predict_batch_compact"))
+            record(bench_batch(fallback, listings, "predict_batch_fallback"))
+            for result in bench_ingestion(listings, work_dir):
+                record(result)
+
+    return results
+
+# ========================================
+# REGRESSION CHECK
+# ========================================
+
+def result_key(result):
+    """Identify a benchmark result across runs"""
+    return (result['benchmark'], result['rows'], result.get('n_jobs'))
+
+def result_cost(result):
+    """Lower is better: p50 latency for latency benchmarks, wall time otherwise"""
+    return result['p50_ms'] if 'p50_ms' in result else result['seconds']
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Return (key, baseline cost, current cost) for benchmarks that got slower than threshold"""
+    baseline_costs = {result_key(r): result_cost(r) for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        key = result_key(result)
+        if key in baseline_costs and result_cost(result) > baseline_costs[key] * (1 + threshold):
+            regressions.append((key, baseline_costs[key], result_cost(result)))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the car pricing hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="row counts for batch, fallback and ingestion benchmarks")
+    parser.add_argument("--train-sizes", type=int, nargs="+", default=None,
+                        help="row counts for training benchmarks (default: --sizes)")
+    parser.add_argument("--cores", type=int, nargs="+", default=None,
+                        help="n_jobs values for training (default: 1 and all cores)")
+    parser.add_argument("--quick", action="store_true", help="small sizes for a smoke run")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--compare", metavar="BASELINE_JSON",
+                        help="fail if any benchmark is slower than this earlier run")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    sizes = QUICK_SIZES if args.quick else args.sizes
+    train_sizes = args.train_sizes or sizes
+    core_counts = args.cores or sorted({1, os.cpu_count()})
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'results': run_benchmarks(sizes, train_sizes, core_counts)
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"📊 Wrote {len(report['results'])} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.threshold)
+        for key, before, after in regressions:
+            print(f"⚠️ Regression in {key}: {before:.4f} -> {after:.4f}")
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions")
+
+if __name__ == "__main__":
+    main()
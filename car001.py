@@ -1,339 +1,407 @@
 # ======================================================
 # SMART CAR PRICING SYSTEM - COMPLETE CAR DATABASE
 # ======================================================
+#
+# Streamlit app. All pricing logic lives in pricing_core, this module only
+# renders it.
 
 import streamlit as st
 import pandas as pd
-import numpy as np
-import plotly.graph_objects as go
-import plotly.express as px
-from sklearn.model_selection import train_test_split, GridSearchCV, cross_val_score
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
 from datetime import datetime
-import io
-import base64
+import copy
+import uuid
+
+from charts import FIGURE_CACHE, bar_chart, line_chart, data_version
+from instrumentation import METRICS, SamplingProfiler, timer
+from job_manager import JobManager
+from history_store import PredictionHistoryStore, HISTORY_PAGE_SIZE, TREND_DAYS
+from pricing_core import (
+    CAR_DATABASE, FUEL_TYPES, TRANSMISSIONS, CAR_CONDITIONS, OWNER_TYPES, INSURANCE_STATUS,
+    COLORS, CITIES, FEATURES, CONTEXT_FEATURES, INCREMENTAL_TREES, PREDICTION_CACHE_SIZE, CV_FOLDS, SPEC_CATALOG,
+    MODEL_BACKENDS, DEFAULT_BACKEND, compare_backends,
+    COMPARISON_DEFAULTS, CarPricePredictor, PredictionCache, normalize_features, normalize_input,
+    read_latest_model_version
+)
+
+JOB_POLL_SECONDS = 1
+# Rows priced per step of a bulk pricing job, between progress reports
+BULK_PRICING_CHUNK_ROWS = 20000
 
 # ========================================
-# COMPREHENSIVE CAR DATABASE FOR MANUAL INPUT
+# SHARED MODEL
 # ========================================
 
-CAR_DATABASE = {
-    'Maruti Suzuki': {
-        'models': ['Alto', 'Alto K10', 'S-Presso', 'Celerio', 'Wagon R', 'Ignis', 'Swift', 'Baleno', 'Dzire', 'Ciaz', 
-                  'Ertiga', 'XL6', 'Vitara Brezza', 'Jimny', 'Fronx', 'Grand Vitara', 'Eeco', 'Omni', 'Celerio X'],
-        'car_types': ['Hatchback', 'Hatchback', 'Hatchback', 'Hatchback', 'Hatchback', 'Hatchback', 'Hatchback', 'Hatchback', 'Sedan', 'Sedan',
-                     'MUV', 'MUV', 'SUV', 'SUV', 'SUV', 'SUV', 'Van', 'Van', 'Hatchback'],
-        'engine_cc': [796, 998, 998, 998, 998, 1197, 1197, 1197, 1197, 1462,
-                     1462, 1462, 1462, 1462, 1197, 1462, 1196, 796, 998],
-        'power_hp': [48, 67, 67, 67, 67, 83, 90, 90, 90, 103,
-                    103, 103, 103, 103, 90, 103, 73, 35, 67],
-        'seats': [5, 5, 5, 5, 5, 5, 5, 5, 5, 5,
-                 7, 6, 5, 5, 5, 5, 5, 8, 5]
-    },
-    'Hyundai': {
-        'models': ['i10', 'i20', 'Aura', 'Grand i10 Nios', 'Verna', 'Creta', 'Venue', 'Alcazar', 'Tucson', 'Kona Electric',
-                  'Santro', 'Xcent', 'Elantra', 'Ioniq 5'],
-        'car_types': ['Hatchback', 'Hatchback', 'Sedan', 'Hatchback', 'Sedan', 'SUV', 'SUV', 'SUV', 'SUV', 'SUV',
-                     'Hatchback', 'Sedan', 'Sedan', 'SUV'],
-        'engine_cc': [1086, 1197, 1197, 1197, 1493, 1493, 1197, 2199, 2199, 0,
-                     1086, 1197, 1999, 0],
-        'power_hp': [69, 83, 83, 83, 115, 115, 83, 148, 148, 136,
-                    69, 83, 152, 217],
-        'seats': [5, 5, 5, 5, 5, 5, 5, 6, 5, 5,
-                 5, 5, 5, 5]
-    },
-    'Tata': {
-        'models': ['Tiago', 'Tigor', 'Altroz', 'Nexon', 'Punch', 'Harrier', 'Safari', 'Nexon EV', 'Tigor EV', 'Tiago EV',
-                  'Indica', 'Indigo', 'Sumo', 'Hexa'],
-        'car_types': ['Hatchback', 'Sedan', 'Hatchback', 'SUV', 'SUV', 'SUV', 'SUV', 'SUV', 'Sedan', 'Hatchback',
-                     'Hatchback', 'Sedan', 'SUV', 'SUV'],
-        'engine_cc': [1199, 1199, 1199, 1199, 1199, 1956, 1956, 0, 0, 0,
-                     1405, 1405, 2179, 2179],
-        'power_hp': [85, 85, 85, 120, 120, 170, 170, 129, 75, 75,
-                    70, 70, 120, 156],
-        'seats': [5, 5, 5, 5, 5, 5, 5, 5, 5, 5,
-                 5, 5, 8, 7]
-    },
-    'Mahindra': {
-        'models': ['Bolero', 'Scorpio', 'XUV300', 'XUV400', 'XUV700', 'Thar', 'Marazzo', 'KUV100', 'TUV300', 'Alturas G4',
-                  'Bolero Neo', 'Scorpio N', 'Verito', 'Xylo'],
-        'car_types': ['SUV', 'SUV', 'SUV', 'SUV', 'SUV', 'SUV', 'MUV', 'Hatchback', 'SUV', 'SUV',
-                     'SUV', 'SUV', 'Sedan', 'MUV'],
-        'engine_cc': [1493, 2179, 1197, 0, 1997, 1997, 1497, 1198, 1493, 2157,
-                     1493, 1997, 1461, 2179],
-        'power_hp': [75, 140, 110, 150, 200, 150, 123, 83, 100, 178,
-                    100, 200, 65, 120],
-        'seats': [7, 7, 5, 5, 7, 4, 8, 5, 7, 7,
-                 7, 7, 5, 8]
-    },
-    'Toyota': {
-        'models': ['Innova Crysta', 'Fortuner', 'Glanza', 'Urban Cruiser Hyryder', 'Camry', 'Vellfire', 'Hilux', 'Etios', 
-                  'Etios Liva', 'Yaris', 'Corolla Altis', 'Innova Hycross'],
-        'car_types': ['MUV', 'SUV', 'Hatchback', 'SUV', 'Sedan', 'MUV', 'Pickup', 'Sedan',
-                     'Hatchback', 'Sedan', 'Sedan', 'MUV'],
-        'engine_cc': [2393, 2694, 1197, 1462, 2487, 2494, 2755, 1496,
-                     1496, 1496, 1798, 1987],
-        'power_hp': [150, 204, 90, 103, 177, 197, 204, 90,
-                    90, 107, 140, 186],
-        'seats': [7, 7, 5, 5, 5, 7, 5, 5,
-                 5, 5, 5, 7]
-    },
-    'Honda': {
-        'models': ['Amaze', 'City', 'Jazz', 'WR-V', 'Elevate', 'Civic', 'CR-V', 'Brio'],
-        'car_types': ['Sedan', 'Sedan', 'Hatchback', 'SUV', 'SUV', 'Sedan', 'SUV', 'Hatchback'],
-        'engine_cc': [1199, 1498, 1199, 1199, 1498, 1799, 1997, 1198],
-        'power_hp': [90, 121, 90, 90, 121, 141, 158, 88],
-        'seats': [5, 5, 5, 5, 5, 5, 5, 5]
-    }
-}
+@st.cache_resource(max_entries=2)
+def load_shared_predictor(version):
+    """Load one predictor per model version, shared by all sessions"""
+    return CarPricePredictor.load_model(version)
 
-FUEL_TYPES = ["Petrol", "Diesel", "CNG", "Electric", "Hybrid"]
-TRANSMISSIONS = ["Manual", "Automatic", "CVT", "DCT", "AMT"]
-CAR_CONDITIONS = ["Excellent", "Very Good", "Good", "Fair", "Poor"]
-OWNER_TYPES = ["First", "Second", "Third", "Fourth & Above"]
-INSURANCE_STATUS = ["Comprehensive", "Third Party", "Expired", "No Insurance"]
-COLORS = ["White", "Black", "Silver", "Grey", "Red", "Blue", "Brown", "Green", "Yellow", "Orange", "Purple", "Other"]
-CITIES = ["Delhi", "Mumbai", "Bangalore", "Chennai", "Pune", "Hyderabad", "Kolkata", "Ahmedabad", "Surat", "Jaipur", "Lucknow", "Chandigarh"]
+def get_session_predictor():
+    """Return the shared trained predictor, or a per-session fallback predictor"""
+    version = read_latest_model_version()
+    if version is not None:
+        try:
+            return load_shared_predictor(version)
+        except Exception as e:
+            st.warning(f"Could not load saved model {version}: {str(e)}")
+    
+    if 'predictor' not in st.session_state:
+        return CarPricePredictor()
+    return st.session_state.predictor
 
 # ========================================
-# SIMPLIFIED PRICE PREDICTION ENGINE
+# SHARED PREDICTION CACHE
 # ========================================
 
-class CarPricePredictor:
-    def __init__(self):
-        self.model = None
-        self.scaler = StandardScaler()
-        self.encoders = {}
-        self.feature_importance = {}
-        self.is_trained = False
-        self.training_data = None
-        self.training_records_count = 0
-        
-    def get_live_prices(self, brand, model):
-        """Get live prices for car models with proper error handling"""
-        try:
-            # Simple price database with default values
-            price_database = {
-                'Maruti Suzuki': {
-                    'Alto': [150000, 250000, 350000],
-                    'Swift': [300000, 450000, 600000],
-                    'Baleno': [350000, 500000, 700000],
-                    'Dzire': [320000, 480000, 650000],
-                    'Vitara Brezza': [500000, 700000, 900000],
-                    'Ertiga': [450000, 650000, 850000],
-                    'Wagon R': [200000, 300000, 400000],
-                    'Celerio': [250000, 350000, 450000]
-                },
-                'Hyundai': {
-                    'i10': [250000, 350000, 450000],
-                    'i20': [350000, 500000, 650000],
-                    'Creta': [600000, 850000, 1100000],
-                    'Verna': [450000, 650000, 850000],
-                    'Venue': [450000, 600000, 800000]
-                },
-                'Tata': {
-                    'Tiago': [250000, 350000, 450000],
-                    'Nexon': [450000, 650000, 850000],
-                    'Altroz': [350000, 500000, 650000],
-                    'Harrier': [800000, 1100000, 1400000],
-                    'Safari': [900000, 1200000, 1500000]
-                },
-                'Mahindra': {
-                    'Scorpio': [500000, 700000, 900000],
-                    'XUV300': [450000, 600000, 800000],
-                    'XUV700': [900000, 1200000, 1500000],
-                    'Thar': [600000, 850000, 1100000]
-                },
-                'Toyota': {
-                    'Innova Crysta': [1000000, 1400000, 1800000],
-                    'Fortuner': [1500000, 2000000, 2500000],
-                    'Glanza': [350000, 500000, 650000]
-                },
-                'Honda': {
-                    'City': [450000, 650000, 850000],
-                    'Amaze': [350000, 500000, 650000]
-                }
-            }
-            
-            # Check if brand exists in database
-            if brand not in price_database:
-                default_prices = [300000, 500000, 800000]
-                return default_prices, ["Market Estimate - Unknown Brand"]
-            
-            # Check if model exists for the brand
-            if model not in price_database[brand]:
-                default_prices = [300000, 500000, 800000]
-                return default_prices, ["Market Estimate - Unknown Model"]
-            
-            # Return the actual prices
-            prices = price_database[brand][model]
-            sources = ["Market Database"]
-            return prices, sources
-            
-        except Exception as e:
-            default_prices = [300000, 500000, 800000]
-            return default_prices, ["General Market Average"]
+@st.cache_resource
+def get_prediction_cache():
+    """One prediction cache per process, shared by all sessions"""
+    return PredictionCache(PREDICTION_CACHE_SIZE)
 
-    def load_csv_data(self, uploaded_file):
-        """Load and process CSV data for training"""
-        try:
-            df = pd.read_csv(uploaded_file)
-            st.success(f"✅ Successfully loaded {len(df)} records from CSV")
-            
-            # Display dataset info
-            st.subheader("📊 Dataset Overview")
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Total Records", len(df))
-            with col2:
-                st.metric("Columns", len(df.columns))
-            with col3:
-                st.metric("Missing Values", df.isnull().sum().sum())
-            
-            # Show sample data
-            with st.expander("View Sample Data"):
-                st.dataframe(df.head(10))
-            
-            return df
-        except Exception as e:
-            st.error(f"Error loading CSV: {str(e)}")
-            return None
+def get_cached_valuation(input_data):
+    """Return the valuation dict (price, band, confidence), cached per model version and normalized inputs"""
+    predictor = st.session_state.predictor
+    input_data = normalize_input(input_data)
+    # A new model version changes the key, so stale entries simply age out
+    key = (predictor.cache_token(), normalize_features(input_data))
+    return get_prediction_cache().get_or_compute(key, lambda: predictor.valuation(input_data))
 
-    def train_from_csv(self, df):
-        """Train model from CSV data"""
-        try:
-            st.info("🔄 Training model from CSV data...")
-            
-            # Identify required columns
-            required_columns = ['Brand', 'Model', 'Year', 'Fuel_Type', 'Transmission', 
-                              'Mileage', 'Engine_cc', 'Power_HP', 'Condition', 'Price']
-            
-            # Check if required columns exist
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                st.error(f"Missing required columns: {missing_columns}")
-                return False
-            
-            # Clean data
-            df_clean = df.dropna()
-            if len(df_clean) < 10:
-                st.error("Not enough data after cleaning. Need at least 10 records.")
-                return False
-            
-            # Prepare features
-            features = ['Brand', 'Model', 'Year', 'Fuel_Type', 'Transmission',
-                       'Mileage', 'Engine_cc', 'Power_HP', 'Condition']
-            
-            X = df_clean[features]
-            y = df_clean['Price']
-            
-            # Encode categorical variables
-            categorical_features = ['Brand', 'Model', 'Fuel_Type', 'Transmission', 'Condition']
-            for feature in categorical_features:
-                self.encoders[feature] = LabelEncoder()
-                X[feature] = self.encoders[feature].fit_transform(X[feature])
-            
-            # Scale numerical features
-            numerical_features = ['Year', 'Mileage', 'Engine_cc', 'Power_HP']
-            X[numerical_features] = self.scaler.fit_transform(X[numerical_features])
-            
-            # Train model
-            self.model = RandomForestRegressor(
-                n_estimators=100,
-                max_depth=15,
-                random_state=42
-            )
-            
-            self.model.fit(X, y)
-            self.is_trained = True
-            self.training_data = df_clean
-            self.training_records_count = len(df_clean)
-            
-            # Store feature importance
-            self.feature_importance = dict(zip(features, self.model.feature_importances_))
-            
-            # Evaluate model
-            y_pred = self.model.predict(X)
-            r2 = r2_score(y, y_pred)
-            mae = mean_absolute_error(y, y_pred)
-            
-            st.success(f"✅ Model trained from CSV! R²: {r2:.3f}, MAE: ₹{mae:,.0f}")
-            
-            # Show feature importance
-            st.subheader("📈 Feature Importance from CSV Data")
-            importance_df = pd.DataFrame({
-                'Feature': list(self.feature_importance.keys()),
-                'Importance': list(self.feature_importance.values())
-            }).sort_values('Importance', ascending=False)
-            
-            fig = px.bar(importance_df, x='Importance', y='Feature', orientation='h',
-                        title='Feature Importance (Trained from CSV)')
-            st.plotly_chart(fig, use_container_width=True)
-            
-            return True
-            
-        except Exception as e:
-            st.error(f"Error training from CSV: {str(e)}")
-            return False
-
-    def predict_price(self, input_data):
-        """Predict car price"""
-        if not self.is_trained:
-            # Use fallback if no model trained
-            return self.fallback_prediction(input_data)
+def show_prediction_cache_stats():
+    """Show prediction cache counters in the sidebar"""
+    stats = get_prediction_cache().stats()
+    st.caption(
+        f"⚡ Cache: {stats['hits']} hits / {stats['misses']} misses "
+        f"({stats['hit_rate']:.0%}), {stats['evictions']} evictions, "
+        f"{stats['size']} entries"
+    )
+
+# ========================================
+# BACKGROUND JOBS
+# ========================================
+
+@st.cache_resource
+def get_job_manager():
+    """One job manager per process, its queues are shared by all sessions"""
+    return JobManager()
+
+def start_background_job(key, pool, label, run):
+    """Queue run(report) on a job pool, keeping only the job id in the session under key"""
+    st.session_state[key] = get_job_manager().submit(pool, run, label, session_id=get_session_id())
+
+def get_session_job(key):
+    """The session's job under key, or None (also once the job manager has forgotten it)"""
+    job_id = st.session_state.get(key)
+    if job_id is None:
+        return None
+    job = get_job_manager().get(job_id)
+    if job is None:
+        del st.session_state[key]
+    return job
+
+def pop_finished_job(key):
+    """The session's job under key once it has finished, dropping it from the session and the manager"""
+    job = get_session_job(key)
+    if job is None or not job.is_finished:
+        return None
+    del st.session_state[key]
+    get_job_manager().forget(job.id)
+    if job.status == "cancelled":
+        st.warning(f"🛑 {job.label} cancelled")
+    return job
+
+def start_training_job(df, base_predictor=None, n_jobs=-1, model_params=None, precompute_surface=False,
+                       backend=DEFAULT_BACKEND, compact=False):
+    """Start a full or incremental training job on the training pool"""
+    def run(report):
+        if base_predictor is not None:
+            # Grow a private copy so the shared model is never mutated in place
+            if base_predictor.model_version:
+                predictor = CarPricePredictor.load_model(base_predictor.model_version, mmap_mode=None)
+            else:
+                predictor = copy.deepcopy(base_predictor)
+            metrics = predictor.update_from_csv(df, n_jobs=n_jobs, progress_callback=report)
+        else:
+            predictor = CarPricePredictor(backend=backend)
+            metrics = predictor.fit_model(df, n_jobs=n_jobs, progress_callback=report,
+                                          model_params=model_params)
         
+        if compact:
+            report(0.9, "Compacting model")
+            metrics['compaction'] = predictor.compact_model()
+        
+        if precompute_surface:
+            predictor.precompute_surface(progress_callback=lambda fraction, message: report(0.9 + 0.05 * fraction, message))
+        
+        # Last chance to cancel, a saved model becomes the shared one
+        report(0.95, "Saving model")
+        save_error = None
         try:
-            # Prepare input features
-            features = ['Brand', 'Model', 'Year', 'Fuel_Type', 'Transmission',
-                       'Mileage', 'Engine_cc', 'Power_HP', 'Condition']
-            
-            input_df = pd.DataFrame([input_data])
-            
-            # Encode categorical variables
-            for feature in ['Brand', 'Model', 'Fuel_Type', 'Transmission', 'Condition']:
-                if feature in self.encoders:
-                    try:
-                        input_df[feature] = self.encoders[feature].transform([input_data[feature]])[0]
-                    except:
-                        input_df[feature] = 0
-            
-            # Scale numerical features
-            numerical_features = ['Year', 'Mileage', 'Engine_cc', 'Power_HP']
-            input_df[numerical_features] = self.scaler.transform(input_df[numerical_features])
-            
-            # Ensure all features are present
-            for feature in features:
-                if feature not in input_df.columns:
-                    input_df[feature] = 0
-            
-            input_df = input_df[features]
-            
-            # Get prediction
-            prediction = self.model.predict(input_df)[0]
-            return max(100000, int(prediction))
-            
+            predictor.save_model()
         except Exception as e:
-            st.warning(f"Using fallback prediction: {str(e)}")
-            return self.fallback_prediction(input_data)
+            save_error = str(e)
+        return predictor, metrics, save_error
     
-    def fallback_prediction(self, input_data):
-        """Fallback price prediction when model fails"""
-        base_prices, _ = self.get_live_prices(input_data['Brand'], input_data['Model'])
-        base_price = base_prices[1]
-        
-        # Simple calculation based on age and condition
-        current_year = datetime.now().year
-        age = current_year - input_data['Year']
-        age_factor = max(0.3, 1 - (age * 0.1))
-        
-        condition_multipliers = {
-            "Excellent": 1.1, "Very Good": 1.0, "Good": 0.9, "Fair": 0.8, "Poor": 0.6
-        }
+    label = "Incremental update" if base_predictor is not None else f"Training ({MODEL_BACKENDS[backend].label})"
+    start_background_job('training_job', 'training', label, run)
+
+def start_evaluation_job(df, n_folds, param_grid, n_jobs=-1, backend=DEFAULT_BACKEND):
+    """Start a cross-validation job on the training pool"""
+    def run(report):
+        return CarPricePredictor(backend=backend).cross_validate(
+            df, n_folds=n_folds, param_grid=param_grid, n_jobs=n_jobs, progress_callback=report
+        )
+    
+    start_background_job('evaluation_job', 'training', f"{n_folds}-fold cross-validation", run)
+
+def start_backend_report_job(df, n_jobs=-1):
+    """Start training every model backend side by side on the training pool"""
+    def run(report):
+        return compare_backends(df, n_jobs=n_jobs, progress_callback=report)
+    
+    start_background_job('backend_report_job', 'training', "Model backend comparison", run)
+
+def show_job_progress(key):
+    """Show progress and a cancel button for a running session job, returns True while it is unfinished"""
+    job = get_session_job(key)
+    if job is None or job.is_finished:
+        return False
+    
+    if job.status == "queued":
+        ahead = get_job_manager().queue_position(job)
+        text = f"⏳ {job.label}: queued" + (f" behind {ahead} job(s)" if ahead else "")
+    else:
+        text = f"🔄 {job.label}: {job.message} ({job.seconds:.0f}s)"
+    col1, col2 = st.columns([5, 1])
+    with col1:
+        st.progress(job.progress, text=text)
+    with col2:
+        if st.button("🛑 Cancel", key=f"cancel_{key}", disabled=job.cancel_event.is_set()):
+            get_job_manager().cancel(job.id)
+            st.rerun()
+    return True
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_job_progress_fragment(keys):
+    """Redraw only the progress of running jobs, rerunning the whole page once one finishes"""
+    running = [show_job_progress(key) for key in keys]
+    if not all(running):
+        st.rerun()
+
+def poll_session_jobs(keys):
+    """Show the given session jobs until they all finish, without rerunning the page meanwhile"""
+    active = [key for key in keys if (job := get_session_job(key)) is not None and not job.is_finished]
+    if active:
+        show_job_progress_fragment(tuple(active))
+
+def cached_upload(name, uploaded_file, load, variant=None):
+    """Parse an upload once per file (and variant), kept in session state so reruns don't reparse it"""
+    key = (uploaded_file.file_id, variant)
+    cached = st.session_state.get(name)
+    if cached is None or cached[0] != key:
+        cached = st.session_state[name] = (key, load())
+    return cached[1]
+
+def show_session_jobs():
+    """List this session's background jobs in the sidebar"""
+    jobs = get_job_manager().jobs(get_session_id())
+    if not jobs:
+        return
+    
+    st.subheader("🗂️ Background Jobs")
+    icons = {'queued': "⏳", 'running': "🔄", 'done': "✅", 'failed': "❌", 'cancelled': "🛑"}
+    for job in jobs:
+        st.caption(f"{icons[job.status]} {job.label}: {job.message} ({job.seconds:.0f}s)")
+
+def show_training_job_status():
+    """Pick up the result of the session's finished training job and show the last training report"""
+    job = pop_finished_job('training_job')
+    if job is not None and job.status == "failed":
+        st.error(f"Error training from CSV: {job.error}")
+    elif job is not None and job.status == "done":
+        predictor, metrics, save_error = job.result
+        if save_error:
+            st.warning(f"Model trained but could not be saved: {save_error}")
+            st.session_state.predictor = predictor
+        else:
+            st.session_state.predictor = load_shared_predictor(predictor.model_version)
+            st.info(f"💾 Saved model version {predictor.model_version}")
         
-        price = base_price * age_factor * condition_multipliers[input_data['Condition']]
-        return max(100000, int(price))
+        # Kept so the report survives reruns, e.g. when its charts are opened, without holding the model
+        st.session_state.training_report = (predictor.backend, dict(predictor.feature_importance), metrics)
+        st.balloons()
+    
+    report = st.session_state.get('training_report')
+    if report is not None:
+        show_training_report(*report)
+
+def show_evaluation_job_status():
+    """Pick up the result of the session's finished evaluation job"""
+    job = pop_finished_job('evaluation_job')
+    if job is not None and job.status == "failed":
+        st.error(f"Error evaluating model: {job.error}")
+        return
+    if job is not None and job.status == "done":
+        st.session_state.evaluation_result = job.result
+    
+    result = st.session_state.get('evaluation_result')
+    if result is None:
+        return
+    
+    st.subheader("🧪 Cross-Validation Results")
+    st.caption(f"Evaluated on a sample of {result['sample_rows']:,} records")
+    
+    candidates_df = pd.DataFrame(result['candidates'])
+    candidates_df['params'] = candidates_df['params'].astype(str)
+    st.dataframe(candidates_df.drop(columns='candidate'), use_container_width=True)
+    st.success(f"🏆 Best parameters: {result['best_params']}")
+    
+    folds_df = pd.DataFrame(result['folds'])
+    folds_df['params'] = folds_df['params'].astype(str)
+    with st.expander("Per-Fold Metrics and Timings"):
+        st.dataframe(folds_df.drop(columns='candidate'), use_container_width=True)
+    
+    show_lazy_charts("📊 R² per Fold", "cv_fold_charts", lambda: show_chart(
+        bar_chart("cv_folds", folds_df, x='fold', y='r2', color='params', barmode='group',
+                  title='R² per Fold (Higher is Better)')
+    ))
+
+def show_backend_report_status():
+    """Pick up and show the session's model backend comparison"""
+    job = pop_finished_job('backend_report_job')
+    if job is not None and job.status == "failed":
+        st.error(f"Error comparing model backends: {job.error}")
+        return
+    if job is not None and job.status == "done":
+        st.session_state.backend_report = job.result
+    
+    results = st.session_state.get('backend_report')
+    if results is None:
+        return
+    
+    st.subheader("⚖️ Model Backend Comparison")
+    report_df = pd.DataFrame(results)
+    report_df['model_mb'] = report_df['model_bytes'] / 1e6
+    st.dataframe(
+        report_df[['label', 'fit_seconds', 'predict_rows_per_second', 'model_mb', 'r2', 'mae', 'holdout_rows']],
+        use_container_width=True, hide_index=True
+    )
+    st.caption(f"Trained on {int(report_df['training_rows'].iloc[0]):,} records with the same holdout split")
+    
+    def show_backend_charts():
+        col1, col2 = st.columns(2)
+        with col1:
+            show_chart(bar_chart("backend_fit", report_df, x='label', y='fit_seconds',
+                                 title='Fit Time (s, Lower is Better)'))
+        with col2:
+            show_chart(bar_chart("backend_size", report_df, x='label', y='model_mb',
+                                 title='Model Size (MB, Lower is Better)'))
+    
+    show_lazy_charts("📊 Fit Time and Model Size", "backend_report_charts", show_backend_charts)
+
+def show_training_report(backend, feature_importance, metrics):
+    """Show training metrics and feature importance"""
+    if metrics['holdout_rows']:
+        st.success(f"✅ Model trained from CSV! Holdout R²: {metrics['r2']:.3f}, "
+                   f"MAE: ₹{metrics['mae']:,.0f} on {metrics['holdout_rows']:,} held-out records")
+    else:
+        st.success(f"✅ Model trained from CSV! R²: {metrics['r2']:.3f}, MAE: ₹{metrics['mae']:,.0f} (in-sample)")
+    
+    st.caption(f"Backend: {MODEL_BACKENDS[backend].label}")
+    if 'preprocessing' in metrics:
+        summary = metrics['preprocessing']
+        st.caption(f"🧹 Kept {summary['rows_kept']:,} of {summary['rows_in']:,} rows: "
+                   f"{summary['dropped_missing']:,} missing required values, "
+                   f"{summary['dropped_invalid_price']:,} implausible prices, "
+                   f"{summary['dropped_duplicates']:,} duplicate listings; "
+                   f"{summary['clipped_values']:,} feature values clipped")
+    if 'compaction' in metrics:
+        compaction = metrics['compaction']
+        st.info(f"🗜️ Compacted {compaction['trees']} trees: {compaction['bytes_before'] / 1e6:.1f} MB → "
+                f"{compaction['bytes_after'] / 1e6:.1f} MB, {compaction['nodes_after']:,} nodes")
+    
+    # Show feature importance
+    importance_df = pd.DataFrame({
+        'Feature': list(feature_importance.keys()),
+        'Importance': list(feature_importance.values())
+    }).sort_values('Importance', ascending=False)
+    
+    show_lazy_charts("📈 Feature Importance from CSV Data", "feature_importance_chart", lambda: show_chart(
+        bar_chart("feature_importance", importance_df, x='Importance', y='Feature', rank_by='Importance',
+                  orientation='h', title='Feature Importance (Trained from CSV)')
+    ), expanded=True)
+
+# ========================================
+# PERFORMANCE INSTRUMENTATION
+# ========================================
+
+def show_chart(fig):
+    """Render a Plotly figure, timed as a pipeline stage"""
+    with timer("render.plotly"):
+        st.plotly_chart(fig, use_container_width=True)
+
+def show_lazy_charts(label, key, render, expanded=False):
+    """Build and send charts only while their expander is open"""
+    expander = st.expander(label, expanded=expanded, key=key, on_change="rerun")
+    if expander.open:
+        with expander:
+            render()
+
+def run_page(show_page):
+    """Render a page, timed, and sampled by the profiler if one run was requested"""
+    stage = f"page.{show_page.__name__}"
+    if not st.session_state.pop('profile_next_run', False):
+        with timer(stage):
+            show_page()
+        return
+    
+    with SamplingProfiler() as profiler, timer(stage):
+        show_page()
+    st.session_state.last_profile = {
+        'page': show_page.__name__,
+        'seconds': profiler.seconds,
+        'samples': profiler.samples,
+        'top': profiler.top(),
+        'collapsed': profiler.collapsed()
+    }
+
+def show_profile_report():
+    """Show the last sampled page run"""
+    profile = st.session_state.get('last_profile')
+    if profile is None:
+        return
+    
+    with st.expander(f"🔬 Profile of {profile['page']} ({profile['seconds']:.2f}s, {profile['samples']} samples)"):
+        st.dataframe(pd.DataFrame(profile['top']), use_container_width=True, hide_index=True)
+        st.download_button("📥 Download Collapsed Stacks", profile['collapsed'],
+                           file_name="profile.collapsed", mime="text/plain")
+        if st.button("Dismiss Profile"):
+            del st.session_state['last_profile']
+            st.rerun()
+
+def show_performance_panel():
+    """Show per-stage timings and counters of this process"""
+    st.subheader("⏱️ Performance")
+    stages, counters = METRICS.snapshot()
+    if not stages:
+        st.caption("No timings recorded yet")
+    else:
+        stages_df = pd.DataFrame(stages)[['stage', 'calls', 'mean_ms', 'p50_ms', 'p99_ms']]
+        st.dataframe(stages_df.round(2), use_container_width=True, hide_index=True)
+    for name, value in counters.items():
+        st.caption(f"{name}: {value:,}")
+    figures = FIGURE_CACHE.stats()
+    st.caption(f"📊 Figure cache: {figures['hits']} hits / {figures['misses']} misses, {figures['size']} figures")
+    
+    st.download_button("📥 Prometheus Metrics", METRICS.to_prometheus(),
+                       file_name="pricing_metrics.prom", mime="text/plain")
+    if st.button("💾 Write Metrics File"):
+        try:
+            st.caption(f"Wrote {METRICS.write()}")
+        except OSError as e:
+            st.error(f"Could not write metrics: {str(e)}")
+    if st.button("🔬 Profile Next Page Run"):
+        st.session_state.profile_next_run = True
+        st.rerun()
 
 # ========================================
 # UTILITY FUNCTIONS
@@ -344,7 +412,7 @@ def show_brand_statistics():
     st.sidebar.subheader("📈 Brand Statistics")
     
     total_brands = len(CAR_DATABASE)
-    total_models = sum(len(CAR_DATABASE[brand]['models']) for brand in CAR_DATABASE)
+    total_models = len(SPEC_CATALOG)
     
     st.sidebar.info(f"""
     **Database Overview:**
@@ -367,12 +435,12 @@ def show_manual_input_form():
             model = st.selectbox("Model", CAR_DATABASE[brand]['models'])
             
             # Auto-fill technical specifications
-            if model in CAR_DATABASE[brand]['models']:
-                model_index = CAR_DATABASE[brand]['models'].index(model)
-                car_type = CAR_DATABASE[brand]['car_types'][model_index]
-                engine_cc = CAR_DATABASE[brand]['engine_cc'][model_index]
-                power_hp = CAR_DATABASE[brand]['power_hp'][model_index]
-                seats = CAR_DATABASE[brand]['seats'][model_index]
+            specs = SPEC_CATALOG.lookup(brand, model)
+            if specs is not None:
+                car_type = specs['car_type']
+                engine_cc = specs['engine_cc']
+                power_hp = specs['power_hp']
+                seats = specs['seats']
                 
                 st.text_input("Car Type", value=car_type, disabled=True)
                 st.text_input("Engine Capacity", value=f"{engine_cc} cc", disabled=True)
@@ -419,233 +487,418 @@ def show_manual_input_form():
     
     return input_data
 
-def calculate_confidence(input_data):
-    """Calculate prediction confidence"""
-    confidence = 80
-    
-    # Increase confidence for newer cars
-    current_year = datetime.now().year
-    if current_year - input_data['Year'] <= 5:
-        confidence += 10
-    
-    # Decrease confidence for high mileage
-    if input_data['Mileage'] > 100000:
-        confidence -= 10
-    
-    return min(95, max(60, confidence))
+@st.cache_resource
+def get_history_store():
+    """One history store per process, shared by all sessions"""
+    return PredictionHistoryStore()
+
+def get_session_id():
+    """Stable id for this browser session, used to tag its predictions"""
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
 
-def add_to_prediction_history(input_data, predicted_price, confidence):
+def add_to_prediction_history(input_data, predicted_price, confidence, valuation=None):
     """Add prediction to history"""
-    if 'prediction_history' not in st.session_state:
-        st.session_state.prediction_history = []
-    
-    history_entry = {
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        'brand': input_data['Brand'],
-        'model': input_data['Model'],
-        'year': input_data['Year'],
-        'mileage': input_data['Mileage'],
-        'condition': input_data['Condition'],
-        'predicted_price': predicted_price,
-        'confidence': confidence
-    }
-    
-    st.session_state.prediction_history.append(history_entry)
-    
-    # Keep only last 100 predictions
-    if len(st.session_state.prediction_history) > 100:
-        st.session_state.prediction_history = st.session_state.prediction_history[-100:]
+    get_history_store().add(
+        input_data,
+        predicted_price,
+        confidence,
+        price_low=valuation['low'] if valuation else None,
+        price_high=valuation['high'] if valuation else None,
+        model_version=st.session_state.predictor.model_version,
+        session_id=get_session_id()
+    )
 
 def show_prediction_history():
     """Show prediction history"""
     st.subheader("📋 Prediction History")
     
-    if 'prediction_history' not in st.session_state or not st.session_state.prediction_history:
+    store = get_history_store()
+    
+    # Filters are applied by the store, not by pandas
+    filter_col1, filter_col2 = st.columns(2)
+    with filter_col1:
+        brand = st.selectbox("Brand", ["All Brands"] + store.brands(), key="history_brand")
+    with filter_col2:
+        session_only = st.checkbox("Only my predictions", value=False)
+    filters = {
+        'brand': None if brand == "All Brands" else brand,
+        'session_id': get_session_id() if session_only else None
+    }
+    
+    stats = store.stats(**filters)
+    if not stats['total']:
         st.info("No prediction history yet. Make some predictions to see them here!")
         return
     
-    # Convert to DataFrame for better display
-    history_df = pd.DataFrame(st.session_state.prediction_history[::-1])  # Show newest first
-    
-    # Display history
+    # Display one page of history, newest first
+    page_count = (stats['total'] - 1) // HISTORY_PAGE_SIZE + 1
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1) - 1
+    history_df = pd.DataFrame(store.query(page=page, **filters))
     st.dataframe(history_df, use_container_width=True)
     
     # Show statistics
     col1, col2, col3 = st.columns(3)
     with col1:
-        total_predictions = len(st.session_state.prediction_history)
-        st.metric("Total Predictions", total_predictions)
+        st.metric("Total Predictions", stats['total'])
     with col2:
-        avg_confidence = history_df['confidence'].mean()
-        st.metric("Average Confidence", f"{avg_confidence:.1f}%")
+        st.metric("Average Confidence", f"{stats['avg_confidence']:.1f}%")
     with col3:
-        if st.button("Clear History"):
-            st.session_state.prediction_history = []
+        if st.button("Clear My History"):
+            store.delete(get_session_id())
             st.rerun()
     
-    # Show chart of recent predictions
-    if len(history_df) > 1:
-        st.subheader("📈 Recent Prediction Trends")
-        recent_history = history_df.head(10)
-        fig = px.line(recent_history, x='timestamp', y='predicted_price', 
-                      title='Recent Price Predictions', markers=True)
-        st.plotly_chart(fig, use_container_width=True)
+    # Show daily price trend
+    trend = store.price_trend(**filters)
+    if len(trend) > 1:
+        trend_df = pd.DataFrame(trend)
+        show_lazy_charts("📈 Prediction Trends", "history_trend_chart", lambda: show_chart(
+            line_chart("history_trend", trend_df, x='day', y='avg_price', hover_data=['predictions'],
+                       title=f'Average Predicted Price per Day (last {TREND_DAYS} days)', markers=True)
+        ))
 
 # ========================================
 # CSV UPLOAD INTERFACE
 # ========================================
 
+def load_csv_data(uploaded_file, streaming=False):
+    """Load CSV data for training and show a dataset overview"""
+    try:
+        df, overview = cached_upload('training_upload', uploaded_file, variant=streaming,
+                                     load=lambda: st.session_state.predictor.load_csv(uploaded_file, streaming=streaming))
+    except Exception as e:
+        st.error(f"Error loading CSV: {str(e)}")
+        return None
+    
+    st.success(f"✅ Successfully loaded {overview['rows']} records from CSV")
+    if overview['from_cache']:
+        st.caption("⚡ Loaded from ingestion cache")
+    
+    # Display dataset info
+    st.subheader("📊 Dataset Overview")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Records", overview['rows'])
+    with col2:
+        st.metric("Columns", overview['columns'])
+    with col3:
+        st.metric("Missing Values", overview['missing'])
+    
+    # Show sample data
+    with st.expander("View Sample Data"):
+        st.dataframe(overview['sample'])
+    
+    return df
+
 def show_csv_upload_interface():
     """Show CSV upload interface for dataset learning"""
     st.subheader("📁 Upload Car Dataset CSV")
     
-    st.info("""
+    st.info(f"""
     **Upload a CSV file with car data to train the AI model.**
     Required columns: Brand, Model, Year, Fuel_Type, Transmission, Mileage, Engine_cc, Power_HP, Condition, Price
+    Optional columns: {', '.join(CONTEXT_FEATURES)}
     """)
     
     uploaded_file = st.file_uploader("Choose CSV file", type=['csv'])
     
     if uploaded_file is not None:
+        streaming = st.checkbox("⚡ Streaming ingestion (large files, compact types, cached)", value=True)
+        
         # Load and process CSV data
-        df = st.session_state.predictor.load_csv_data(uploaded_file)
+        df = load_csv_data(uploaded_file, streaming=streaming)
         
-        if df is not None:
+        if df is not None and 'training_job' not in st.session_state:
+            predictor = st.session_state.predictor
+            training_modes = ["Full retrain"]
+            if predictor.is_trained and MODEL_BACKENDS[predictor.backend].incremental and not predictor.is_compact:
+                training_modes.append(f"Incremental update (add {INCREMENTAL_TREES} trees)")
+            training_mode = st.radio("Training Mode", training_modes, horizontal=True)
+            backend = predictor.backend if predictor.is_trained else DEFAULT_BACKEND
+            if training_mode == "Full retrain":
+                backend = st.radio("Model Backend", list(MODEL_BACKENDS), horizontal=True,
+                                   index=list(MODEL_BACKENDS).index(DEFAULT_BACKEND),
+                                   format_func=lambda name: MODEL_BACKENDS[name].label)
+            use_all_cores = st.checkbox("Use all CPU cores", value=True)
+            precompute_surface = st.checkbox("⚡ Precompute depreciation surface (instant depreciation curves)")
+            compact = False
+            if backend == "random_forest":
+                compact = st.checkbox("🗜️ Compact model (smaller, faster single predictions, can't be updated incrementally)")
+            
+            model_params = None
+            evaluation_result = st.session_state.get('evaluation_result')
+            if evaluation_result and training_mode == "Full retrain" and evaluation_result['backend'] == backend:
+                if st.checkbox(f"Use best parameters from evaluation: {evaluation_result['best_params']}"):
+                    model_params = evaluation_result['best_params']
+            
             # Train model button
             if st.button("🚀 Train Model from CSV Data", type="primary"):
-                success = st.session_state.predictor.train_from_csv(df)
-                if success:
-                    st.balloons()
+                base_predictor = predictor if training_mode != "Full retrain" else None
+                start_training_job(
+                    df, base_predictor=base_predictor, n_jobs=-1 if use_all_cores else 1,
+                    model_params=model_params, precompute_surface=precompute_surface, backend=backend,
+                    compact=compact
+                )
+                st.rerun()
+        
+        if df is not None and 'evaluation_job' not in st.session_state:
+            with st.expander("🧪 Evaluate with Cross-Validation"):
+                cv_backend = st.radio("Backend to Evaluate", list(MODEL_BACKENDS), horizontal=True,
+                                      index=list(MODEL_BACKENDS).index(DEFAULT_BACKEND),
+                                      format_func=lambda name: MODEL_BACKENDS[name].label, key="cv_backend")
+                param_grid = MODEL_BACKENDS[cv_backend].param_grid
+                n_folds = st.slider("Folds", min_value=3, max_value=10, value=CV_FOLDS)
+                grid_search = st.checkbox(f"Hyperparameter search over {param_grid}")
+                if st.button("🧪 Run Cross-Validation"):
+                    start_evaluation_job(
+                        df, n_folds, param_grid if grid_search else None, backend=cv_backend
+                    )
+                    st.rerun()
+        
+        if df is not None and 'backend_report_job' not in st.session_state:
+            with st.expander("⚖️ Compare Model Backends"):
+                st.caption("Trains every backend on this data and reports fit time, prediction throughput, "
+                           "model size and holdout accuracy")
+                if st.button("⚖️ Run Backend Comparison"):
+                    start_backend_report_job(df)
+                    st.rerun()
+    
+    # Poll background jobs until they finish
+    poll_session_jobs(('training_job', 'evaluation_job', 'backend_report_job'))
+    
+    show_training_job_status()
+    show_evaluation_job_status()
+    show_backend_report_status()
+
+# ========================================
+# BULK PRICING INTERFACE
+# ========================================
+
+def show_bulk_pricing_interface():
+    """Show bulk pricing interface for uploaded inventory CSV"""
+    st.subheader("💰 Bulk Inventory Pricing")
+    
+    st.info(f"""
+    **Upload a CSV of listings to price them all at once.**
+    Required columns: {', '.join(FEATURES)}
+    Optional columns: {', '.join(CONTEXT_FEATURES)}
+    """)
+    
+    uploaded_file = st.file_uploader("Choose listings CSV", type=['csv'], key="bulk_pricing_file")
+    
+    if uploaded_file is not None:
+        try:
+            listings_df = cached_upload('bulk_pricing_upload', uploaded_file, lambda: pd.read_csv(uploaded_file))
+        except Exception as e:
+            st.error(f"Error loading CSV: {str(e)}")
+            return
+        
+        st.success(f"✅ Loaded {len(listings_df)} listings")
+        
+        if 'bulk_pricing_job' not in st.session_state:
+            include_range = st.checkbox("Include price range (low / median / high)", value=True)
+            if st.button("💰 Price Listings", type="primary", disabled=listings_df.empty):
+                start_bulk_pricing_job(listings_df, include_range, uploaded_file.file_id)
+                st.rerun()
+    
+    poll_session_jobs(('bulk_pricing_job',))
+    
+    job = pop_finished_job('bulk_pricing_job')
+    if job is not None and job.status == "failed":
+        st.error(job.error)
+    elif job is not None and job.status == "done":
+        st.session_state.bulk_pricing_result = job.result
+    
+    # Results stay up across reruns while the same file is loaded
+    result = st.session_state.get('bulk_pricing_result')
+    if result is not None and uploaded_file is not None and result[0] == uploaded_file.file_id:
+        priced_df = result[1]
+        st.dataframe(priced_df.head(100), use_container_width=True)
+        st.download_button(
+            "⬇️ Download Priced CSV",
+            data=priced_df.to_csv(index=False).encode('utf-8'),
+            file_name="priced_listings.csv",
+            mime="text/csv"
+        )
+
+def start_bulk_pricing_job(listings_df, include_range, file_id):
+    """Start pricing uploaded listings in chunks on the pricing pool"""
+    predictor = st.session_state.predictor
+    
+    def run(report):
+        parts = []
+        for start in range(0, len(listings_df), BULK_PRICING_CHUNK_ROWS):
+            report(start / len(listings_df), f"Priced {start:,} of {len(listings_df):,} listings")
+            chunk = listings_df.iloc[start:start + BULK_PRICING_CHUNK_ROWS]
+            prices = predictor.predict_batch(chunk, return_interval=include_range)
+            parts.append(prices if include_range else pd.Series(prices, index=chunk.index, name='Predicted_Price'))
+        return file_id, listings_df.join(pd.concat(parts))
+    
+    start_background_job('bulk_pricing_job', 'pricing', f"Pricing {len(listings_df):,} listings", run)
 
 # ========================================
 # CAR COMPARISON INTERFACE
 # ========================================
 
+def empty_comparison_table():
+    """Empty comparison selection table"""
+    return pd.DataFrame({
+        'Brand': pd.Series(dtype=object),
+        'Model': pd.Series(dtype=object),
+        'Year': pd.Series(dtype='Int64'),
+        'Condition': pd.Series(dtype=object),
+        'Mileage': pd.Series(dtype='Int64')
+    })
+
+def add_cars_to_comparison(models, year, condition):
+    """Append catalog models to the comparison table"""
+    cars = models[['Brand', 'Model']].assign(Year=year, Condition=condition, Mileage=COMPARISON_DEFAULTS['Mileage'])
+    st.session_state.cars_to_compare = pd.concat(
+        [st.session_state.cars_to_compare, cars], ignore_index=True
+    ).astype(empty_comparison_table().dtypes.to_dict())
+
 def show_car_comparison_interface():
     """Show car comparison interface"""
     st.subheader("🔍 Compare Multiple Cars")
     
-    st.info("Compare up to 3 cars side by side to make informed decisions")
+    st.info("Compare any number of cars side by side: add rows to the table, or a whole segment or brand at once")
     
-    # Initialize comparison list in session state
+    # Initialize comparison table in session state
     if 'cars_to_compare' not in st.session_state:
-        st.session_state.cars_to_compare = []
+        st.session_state.cars_to_compare = empty_comparison_table()
     
-    # Car selection forms
-    cols = st.columns(3)
+    # Quick add a whole segment or brand
+    with st.expander("➕ Add a segment or brand", expanded=st.session_state.cars_to_compare.empty):
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            group = st.radio("Add by", ["Segment", "Brand"], key="compare_group")
+        with col2:
+            if group == "Segment":
+                car_types = sorted(SPEC_CATALOG.car_type_categories)
+                choice = st.selectbox("Segment", car_types, key="compare_segment")
+            else:
+                choice = st.selectbox("Brand", list(CAR_DATABASE.keys()), key="compare_brand")
+        with col3:
+            year = st.number_input("Year", min_value=1990, max_value=datetime.now().year,
+                                   value=datetime.now().year-3, key="compare_year")
+        with col4:
+            condition = st.selectbox("Condition", CAR_CONDITIONS, key="compare_condition")
+        
+        if st.button("Add to Comparison", key="compare_add_group"):
+            if group == "Segment":
+                models = SPEC_CATALOG.models_frame(car_type=choice)
+            else:
+                models = SPEC_CATALOG.models_frame(brand=choice)
+            add_cars_to_comparison(models, year, condition)
+            st.success(f"Added {len(models)} cars from {choice} to comparison!")
     
-    for i in range(3):
-        with cols[i]:
-            st.write(f"**Car {i+1}**")
-            brand = st.selectbox(f"Brand {i+1}", list(CAR_DATABASE.keys()), key=f"brand_{i}")
-            
-            if brand in CAR_DATABASE:
-                model = st.selectbox(f"Model {i+1}", CAR_DATABASE[brand]['models'], key=f"model_{i}")
-                year = st.number_input(f"Year {i+1}", min_value=1990, max_value=datetime.now().year, 
-                                     value=datetime.now().year-3, key=f"year_{i}")
-                condition = st.selectbox(f"Condition {i+1}", CAR_CONDITIONS, key=f"condition_{i}")
-                
-                if st.button(f"Add Car {i+1}", key=f"add_{i}"):
-                    car_data = {
-                        'brand': brand,
-                        'model': model,
-                        'year': year,
-                        'condition': condition
-                    }
-                    st.session_state.cars_to_compare.append(car_data)
-                    st.success(f"Added {brand} {model} to comparison!")
+    # Editable selection table, one row per car
+    all_models = sorted(set(SPEC_CATALOG.model))
+    cars = st.data_editor(
+        st.session_state.cars_to_compare,
+        num_rows="dynamic",
+        use_container_width=True,
+        hide_index=True,
+        key="compare_table",
+        column_config={
+            'Brand': st.column_config.SelectboxColumn("Brand", options=list(CAR_DATABASE.keys()), required=True),
+            'Model': st.column_config.SelectboxColumn("Model", options=all_models, required=True),
+            'Year': st.column_config.NumberColumn("Year", min_value=1990, max_value=datetime.now().year,
+                                                  default=datetime.now().year-3, required=True),
+            'Condition': st.column_config.SelectboxColumn("Condition", options=CAR_CONDITIONS,
+                                                          default="Good", required=True),
+            'Mileage': st.column_config.NumberColumn("Mileage (km)", min_value=0, max_value=500000,
+                                                     default=COMPARISON_DEFAULTS['Mileage'])
+        }
+    )
+    
+    cars = cars.dropna(subset=['Brand', 'Model'])
+    st.caption(f"{len(cars)} cars selected")
     
     # Show comparison button
-    if st.session_state.cars_to_compare and st.button("🔄 Compare Cars", type="primary"):
-        compare_cars(st.session_state.cars_to_compare)
+    if not cars.empty and 'comparison_job' not in st.session_state:
+        if st.button("🔄 Compare Cars", type="primary"):
+            start_comparison_job(cars)
+            st.rerun()
+    
+    poll_session_jobs(('comparison_job',))
+    
+    job = pop_finished_job('comparison_job')
+    if job is not None and job.status == "failed":
+        st.error(f"Error comparing cars: {job.error}")
+    elif job is not None and job.status == "done":
+        st.session_state.comparison_result = job.result
+    
+    # Results stay up across reruns until the cars change
+    result = st.session_state.get('comparison_result')
+    if result is not None and result[0] == data_version(cars):
+        version, comparison_df, skipped = result
+        if skipped:
+            st.warning("⚠️ Skipped models that don't belong to their brand: " + ", ".join(skipped))
+        if comparison_df is not None:
+            show_comparison_results(comparison_df)
     
     # Clear comparison button
-    if st.session_state.cars_to_compare:
+    if not st.session_state.cars_to_compare.empty or not cars.empty:
         if st.button("Clear Comparison"):
-            st.session_state.cars_to_compare = []
+            st.session_state.cars_to_compare = empty_comparison_table()
+            st.session_state.pop('compare_table', None)
+            st.session_state.pop('comparison_result', None)
+            job = get_session_job('comparison_job')
+            if job is not None:
+                get_job_manager().cancel(job.id)
             st.rerun()
 
-def compare_cars(cars_to_compare):
-    """Compare multiple cars"""
-    comparison_data = []
-    
-    with st.spinner("Comparing cars..."):
-        for i, car in enumerate(cars_to_compare):
-            # Prepare input data for prediction
-            input_data = {
-                'Brand': car['brand'],
-                'Model': car['model'],
-                'Year': car['year'],
-                'Fuel_Type': 'Petrol',
-                'Transmission': 'Manual',
-                'Mileage': 30000,
-                'Engine_cc': 1200,
-                'Power_HP': 80,
-                'Condition': car['condition'],
-                'Seats': 5
-            }
-            
-            # Get predicted price
-            predicted_price = st.session_state.predictor.predict_price(input_data)
-            
-            # Get market prices
-            market_prices, _ = st.session_state.predictor.get_live_prices(car['brand'], car['model'])
-            
-            # Get car specifications
-            if car['brand'] in CAR_DATABASE and car['model'] in CAR_DATABASE[car['brand']]['models']:
-                model_index = CAR_DATABASE[car['brand']]['models'].index(car['model'])
-                car_type = CAR_DATABASE[car['brand']]['car_types'][model_index]
-                engine_cc = CAR_DATABASE[car['brand']]['engine_cc'][model_index]
-                power_hp = CAR_DATABASE[car['brand']]['power_hp'][model_index]
-                seats = CAR_DATABASE[car['brand']]['seats'][model_index]
-            else:
-                car_type = "Unknown"
-                engine_cc = 0
-                power_hp = 0
-                seats = 5
-            
-            comparison_data.append({
-                'Car': f"Car {i+1}",
-                'Brand': car['brand'],
-                'Model': car['model'],
-                'Year': car['year'],
-                'Type': car_type,
-                'Engine (cc)': engine_cc,
-                'Power (HP)': power_hp,
-                'Seats': seats,
-                'Condition': car['condition'],
-                'Predicted Price': predicted_price,
-                'Market Low': market_prices[0],
-                'Market Average': market_prices[1],
-                'Market High': market_prices[2],
-                'Value Score': (predicted_price / market_prices[1]) * 100 if market_prices[1] > 0 else 0
-            })
-    
-    if comparison_data:
-        # Create comparison dataframe
-        comparison_df = pd.DataFrame(comparison_data)
-        
-        st.subheader("📊 Car Comparison Results")
-        st.dataframe(comparison_df, use_container_width=True)
-        
-        # Visual comparison
-        st.subheader("📈 Visual Comparison")
-        
+def start_comparison_job(cars):
+    """Start pricing the selected cars side by side on the pricing pool"""
+    version = data_version(cars)
+    predictor = st.session_state.predictor
+    cars_to_compare, skipped = comparable_cars(cars)
+    
+    def run(report):
+        report(0.0, f"Comparing {len(cars_to_compare)} cars")
+        if cars_to_compare.empty:
+            return version, None, skipped
+        return version, predictor.compare_cars(cars_to_compare), skipped
+    
+    start_background_job('comparison_job', 'pricing', f"Comparing {len(cars)} cars", run)
+
+def comparable_cars(cars_to_compare):
+    """Catalog cars from the comparison table with defaults filled in, and the skipped car names"""
+    # Only catalog brand/model pairs have real specs and market prices
+    known = [SPEC_CATALOG.row(brand, model) >= 0
+             for brand, model in zip(cars_to_compare['Brand'], cars_to_compare['Model'])]
+    unknown = cars_to_compare[[not ok for ok in known]]
+    skipped = [f"{brand} {model}" for brand, model in zip(unknown['Brand'], unknown['Model'])]
+    cars_to_compare = cars_to_compare[known]
+    return cars_to_compare.assign(
+        Year=cars_to_compare['Year'].fillna(datetime.now().year - 3),
+        Condition=cars_to_compare['Condition'].fillna("Good")
+    ), skipped
+
+def show_comparison_results(comparison_df):
+    """Show the comparison table and its charts"""
+    st.subheader("📊 Car Comparison Results")
+    st.dataframe(comparison_df, use_container_width=True, hide_index=True)
+    
+    # Visual comparison, built only when opened
+    def show_comparison_charts():
         # Price comparison chart
-        fig1 = px.bar(comparison_df, 
-                     x='Car', 
-                     y=['Predicted Price', 'Market Average'],
-                     title='Price Comparison',
-                     barmode='group')
-        st.plotly_chart(fig1, use_container_width=True)
+        show_chart(bar_chart("comparison_prices", comparison_df,
+                             x='Car',
+                             y=['Predicted Price', 'Market Average'],
+                             title='Price Comparison',
+                             barmode='group'))
         
         # Value score comparison
-        fig2 = px.bar(comparison_df,
-                     x='Car',
-                     y='Value Score',
-                     title='Value Score (Higher is Better)',
-                     color='Value Score')
-        st.plotly_chart(fig2, use_container_width=True)
+        show_chart(bar_chart("comparison_value", comparison_df.sort_values('Value Score', ascending=False),
+                             x='Car',
+                             y='Value Score',
+                             title='Value Score (Higher is Better)',
+                             color='Value Score'))
+    
+    show_lazy_charts("📈 Visual Comparison", "comparison_charts", show_comparison_charts, expanded=True)
 
 # ========================================
 # MAIN PREDICTION INTERFACE
@@ -668,7 +921,9 @@ def show_prediction_interface():
             
             if brand and model:
                 with st.spinner('🔍 Analyzing market trends...'):
-                    prices, sources = st.session_state.predictor.get_live_prices(brand, model)
+                    prices, sources = st.session_state.predictor.get_live_prices(
+                        brand, model, input_data['Year'], input_data.get('Registration_City')
+                    )
                     min_price, avg_price, max_price = prices
                 
                 st.subheader("📊 Market Intelligence")
@@ -689,29 +944,38 @@ def show_prediction_interface():
             
             if st.button("🎯 Get Price Prediction", type="primary", use_container_width=True):
                 with st.spinner('🤖 Calculating price...'):
-                    # Get AI prediction
-                    predicted_price = st.session_state.predictor.predict_price(input_data)
-                    
-                    # Show confidence
-                    confidence = calculate_confidence(input_data)
+                    # Get AI prediction, price band and confidence
+                    valuation = get_cached_valuation(input_data)
+                    predicted_price = valuation['price']
+                    confidence = valuation['confidence']
                     
                     # Display result
                     st.success(f"**Predicted Price: ₹{predicted_price:,.0f}**")
+                    st.caption(f"Likely range: ₹{valuation['low']:,.0f} – ₹{valuation['high']:,.0f}")
                     st.metric("Confidence Level", f"{confidence}%")
                     
                     # Add to prediction history
-                    add_to_prediction_history(input_data, predicted_price, confidence)
+                    add_to_prediction_history(input_data, predicted_price, confidence, valuation)
                     
                     st.balloons()
+        
+        # Depreciation curve straight from the precomputed surface
+        surface = st.session_state.predictor.surface
+        if surface is not None:
+            curve = surface.curve(input_data)
+            if not curve.empty:
+                show_lazy_charts("📉 Depreciation Curve", "depreciation_curve_chart", lambda: show_chart(
+                    line_chart("depreciation_curve", curve, x='Year', y=['Price_Low', 'Predicted_Price', 'Price_High'],
+                               title=f"{input_data['Brand']} {input_data['Model']} value by model year (typical listing)")
+                ))
 
 # ========================================
 # MAIN APPLICATION
 # ========================================
 
 def main():
-    # Initialize session state
-    if 'predictor' not in st.session_state:
-        st.session_state.predictor = CarPricePredictor()
+    # Use the shared saved model when there is one
+    st.session_state.predictor = get_session_predictor()
     
     st.set_page_config(
         page_title="Advanced Car Price Predictor", 
@@ -732,6 +996,7 @@ def main():
         page = st.radio("Go to", [
             "🎯 Price Prediction", 
             "📁 CSV Upload & Learning", 
+            "💰 Bulk Pricing", 
             "🔍 Car Comparison", 
             "📋 Prediction History"
         ])
@@ -748,24 +1013,34 @@ def main():
         st.subheader("Model Status")
         if st.session_state.predictor.is_trained:
             st.success("✅ Model Trained")
-            # Safe check for training_data
-            if hasattr(st.session_state.predictor, 'training_data') and st.session_state.predictor.training_data is not None:
+            if st.session_state.predictor.training_records_count:
                 st.info(f"📊 Trained on {st.session_state.predictor.training_records_count} records")
+            st.caption(f"Backend: {MODEL_BACKENDS[st.session_state.predictor.backend].label}"
+                       + (" (compacted)" if st.session_state.predictor.is_compact else ""))
+            if st.session_state.predictor.model_version:
+                st.caption(f"Model version: {st.session_state.predictor.model_version}")
         else:
             st.warning("⚠️ Using Fallback Model")
+        show_prediction_cache_stats()
+        show_session_jobs()
+        
+        st.markdown("---")
+        performance_panel = st.container()
     
     # Page routing
-    if page == "🎯 Price Prediction":
-        show_prediction_interface()
-    
-    elif page == "📁 CSV Upload & Learning":
-        show_csv_upload_interface()
-    
-    elif page == "🔍 Car Comparison":
-        show_car_comparison_interface()
+    pages = {
+        "🎯 Price Prediction": show_prediction_interface,
+        "📁 CSV Upload & Learning": show_csv_upload_interface,
+        "💰 Bulk Pricing": show_bulk_pricing_interface,
+        "🔍 Car Comparison": show_car_comparison_interface,
+        "📋 Prediction History": show_prediction_history
+    }
+    run_page(pages[page])
+    show_profile_report()
     
-    elif page == "📋 Prediction History":
-        show_prediction_history()
+    # Filled in last so it includes this run's timings
+    with performance_panel:
+        show_performance_panel()
 
 if __name__ == "__main__":
     main()
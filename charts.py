@@ -0,0 +1,128 @@
+# ======================================================
+# SMART CAR PRICING SYSTEM - CHART LAYER
+# ======================================================
+#
+# Builds Plotly figures with a bounded payload. Long series are downsampled
+# server side before serialization (Largest-Triangle-Three-Buckets for lines,
+# the largest bars for bar charts), and built figures are cached per chart
+# and data version so reruns with unchanged data skip the rebuild.
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from instrumentation import timer
+from pricing_core import PredictionCache
+
+# Points kept per line chart and bars per bar chart, bounds each figure's payload
+CHART_MAX_POINTS = 1000
+CHART_MAX_BARS = 40
+CHART_CACHE_SIZE = 128
+
+# Built figures shared by all sessions, keyed on (chart name, data version)
+FIGURE_CACHE = PredictionCache(CHART_CACHE_SIZE)
+
+# ========================================
+# DOWNSAMPLING
+# ========================================
+
+def lttb_indices(x, y, n_out):
+    """Row positions kept by Largest-Triangle-Three-Buckets, always the first and last row"""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Average of the next bucket, or the last point after the final bucket
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+
+        # Keep the point spanning the largest triangle with the previous pick and the next average
+        area = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        kept[i + 1] = previous
+    return kept
+
+def numeric_axis(values):
+    """Float positions for an x column, row order for labels like dates as strings"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(float)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float)
+    return np.arange(len(values), dtype=float)
+
+def downsample_lines(df, x, y_columns, max_points=CHART_MAX_POINTS):
+    """Rows of df kept so that every y series keeps its shape in at most max_points points"""
+    if len(df) <= max_points:
+        return df
+
+    if pd.api.types.is_numeric_dtype(df[x]) or pd.api.types.is_datetime64_any_dtype(df[x]):
+        df = df.sort_values(x)
+    x_values = numeric_axis(df[x])
+    budget = max(3, max_points // len(y_columns))
+    kept = np.unique(np.concatenate([
+        lttb_indices(x_values, df[column].to_numpy(dtype=float), budget) for column in y_columns
+    ]))
+    return df.iloc[kept]
+
+def largest_bars(df, y, max_bars=CHART_MAX_BARS):
+    """The max_bars rows with the largest y, in their original order"""
+    if len(df) <= max_bars:
+        return df
+    largest = np.argsort(-df[y].to_numpy(dtype=float), kind='stable')[:max_bars]
+    return df.iloc[np.sort(largest)]
+
+# ========================================
+# CACHED FIGURES
+# ========================================
+
+def data_version(df):
+    """Content hash of a DataFrame, changes whenever its values or index do"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(list(df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def cached_figure(name, df, build):
+    """build(df) once per chart name (any hashable) and data version"""
+    def timed_build():
+        with timer("render.build_figure"):
+            return build(df)
+
+    return FIGURE_CACHE.get_or_compute((name, data_version(df)), timed_build)
+
+def sampled_title(title, shown, total):
+    """Chart title noting how many points a downsampled chart shows"""
+    if shown == total:
+        return title
+    return f"{title} (showing {shown:,} of {total:,})"
+
+def line_chart(name, df, x, y, title=None, max_points=CHART_MAX_POINTS, **kwargs):
+    """px.line figure over at most max_points rows, cached per data version"""
+    y_columns = y if isinstance(y, list) else [y]
+
+    def build(df):
+        sampled = downsample_lines(df, x, y_columns, max_points)
+        return px.line(sampled, x=x, y=y, title=sampled_title(title, len(sampled), len(df)), **kwargs)
+
+    return cached_figure((name, title), df, build)
+
+def bar_chart(name, df, x, y, title=None, max_bars=CHART_MAX_BARS, rank_by=None, **kwargs):
+    """px.bar figure over at most max_bars rows, the largest by rank_by (default the first y), cached per data version"""
+    rank_by = rank_by or (y[0] if isinstance(y, list) else y)
+
+    def build(df):
+        sampled = largest_bars(df, rank_by, max_bars)
+        return px.bar(sampled, x=x, y=y, title=sampled_title(title, len(sampled), len(df)), **kwargs)
+
+    return cached_figure((name, title), df, build)
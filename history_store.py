@@ -0,0 +1,143 @@
+# ======================================================
+# SMART CAR PRICING SYSTEM - PREDICTION HISTORY STORE
+# ======================================================
+#
+# Durable, append-only log of valuations in SQLite (WAL mode), shared by all
+# sessions and processes. Filtering, pagination and aggregate stats run in
+# SQL against indexed columns.
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+HISTORY_DB_PATH = os.environ.get("CAR_PRICE_HISTORY_DB", "prediction_history.db")
+HISTORY_PAGE_SIZE = 50
+TREND_DAYS = 90
+
+HISTORY_COLUMNS = ['timestamp', 'brand', 'model', 'year', 'mileage', 'condition',
+                   'predicted_price', 'price_low', 'price_high', 'confidence', 'model_version']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    session_id TEXT,
+    brand TEXT NOT NULL,
+    model TEXT NOT NULL,
+    year INTEGER,
+    mileage INTEGER,
+    condition TEXT,
+    predicted_price INTEGER,
+    price_low INTEGER,
+    price_high INTEGER,
+    confidence REAL,
+    model_version TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp);
+CREATE INDEX IF NOT EXISTS idx_predictions_brand_model ON predictions (brand, model, timestamp);
+CREATE INDEX IF NOT EXISTS idx_predictions_session ON predictions (session_id, timestamp);
+"""
+
+class PredictionHistoryStore:
+    """Append-optimized SQLite log of predictions with indexed, paginated queries"""
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        self.local = threading.local()
+        connection = self.connection()
+        connection.executescript(SCHEMA)
+        connection.commit()
+
+    def connection(self):
+        """One connection per thread, SQLite connections must not be shared across threads"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            # WAL lets readers run alongside the single appending writer
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def add(self, input_data, predicted_price, confidence, price_low=None, price_high=None,
+            model_version=None, session_id=None):
+        """Append one prediction"""
+        connection = self.connection()
+        connection.execute(
+            "INSERT INTO predictions (timestamp, session_id, brand, model, year, mileage, condition, "
+            "predicted_price, price_low, price_high, confidence, model_version) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                session_id,
+                input_data['Brand'],
+                input_data['Model'],
+                int(input_data['Year']),
+                int(input_data['Mileage']),
+                input_data['Condition'],
+                int(predicted_price),
+                None if price_low is None else int(price_low),
+                None if price_high is None else int(price_high),
+                float(confidence),
+                model_version
+            )
+        )
+        connection.commit()
+
+    def where_clause(self, brand=None, model=None, session_id=None, since=None):
+        """Build a WHERE clause and parameters for the given filters"""
+        conditions = []
+        params = []
+        for column, value in [('brand', brand), ('model', model), ('session_id', session_id)]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    def query(self, page=0, page_size=HISTORY_PAGE_SIZE, **filters):
+        """Return one page of predictions as dicts, newest first"""
+        where, params = self.where_clause(**filters)
+        rows = self.connection().execute(
+            f"SELECT {', '.join(HISTORY_COLUMNS)} FROM predictions{where} "
+            f"ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+            params + [page_size, page * page_size]
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self, **filters):
+        """Count, average confidence and average price for the filtered predictions"""
+        where, params = self.where_clause(**filters)
+        row = self.connection().execute(
+            f"SELECT COUNT(*) AS total, AVG(confidence) AS avg_confidence, "
+            f"AVG(predicted_price) AS avg_price FROM predictions{where}",
+            params
+        ).fetchone()
+        return dict(row)
+
+    def price_trend(self, days=TREND_DAYS, **filters):
+        """Daily prediction count and average predicted price over the last days"""
+        since = datetime.fromtimestamp(datetime.now().timestamp() - days * 86400).strftime("%Y-%m-%d")
+        where, params = self.where_clause(since=since, **filters)
+        rows = self.connection().execute(
+            f"SELECT substr(timestamp, 1, 10) AS day, COUNT(*) AS predictions, "
+            f"AVG(predicted_price) AS avg_price FROM predictions{where} "
+            f"GROUP BY day ORDER BY day",
+            params
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def brands(self):
+        """Brands that appear in the history"""
+        rows = self.connection().execute("SELECT DISTINCT brand FROM predictions ORDER BY brand").fetchall()
+        return [row['brand'] for row in rows]
+
+    def delete(self, session_id):
+        """Delete the predictions made by one session"""
+        connection = self.connection()
+        connection.execute("DELETE FROM predictions WHERE session_id = ?", (session_id,))
+        connection.commit()
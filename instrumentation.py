@@ -0,0 +1,238 @@
+# ======================================================
+# SMART CAR PRICING SYSTEM - INSTRUMENTATION
+# ======================================================
+#
+# Process-wide stage timings (counters and latency histograms) with a
+# Prometheus text export, plus an opt-in sampling profiler for one request.
+# Standard library only, so the pricing core can import it for free.
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+METRICS_FILE = os.environ.get("CAR_PRICE_METRICS_FILE", "pricing_metrics.prom")
+METRIC_PREFIX = "car_pricing"
+
+# Histogram bucket upper bounds in seconds, Prometheus style
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+PROFILE_INTERVAL_SECONDS = 0.005
+PROFILE_TOP_FUNCTIONS = 25
+
+# ========================================
+# METRICS REGISTRY
+# ========================================
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with count and sum"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        # Linear scan beats bisect for a dozen buckets
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q):
+        """Estimate the q-th quantile, interpolating inside its bucket like histogram_quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+class MetricsRegistry:
+    """Thread-safe counters and per-stage latency histograms"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def increment(self, name, amount=1):
+        """Add to a counter"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, stage, seconds):
+        """Record one timing of a stage"""
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the enclosed block as one observation of stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage):
+        """Decorator timing every call of a function as stage"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(stage, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """Per-stage summary rows and counters, for display"""
+        with self.lock:
+            stages = [
+                {
+                    'stage': stage,
+                    'calls': h.count,
+                    'total_s': h.total,
+                    'mean_ms': h.total / h.count * 1000 if h.count else 0.0,
+                    'p50_ms': h.quantile(0.5) * 1000,
+                    'p99_ms': h.quantile(0.99) * 1000
+                }
+                for stage, h in self.histograms.items()
+            ]
+            counters = dict(self.counters)
+        return sorted(stages, key=lambda row: row['total_s'], reverse=True), counters
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = [
+            f"# HELP {METRIC_PREFIX}_uptime_seconds Seconds since the metrics registry started",
+            f"# TYPE {METRIC_PREFIX}_uptime_seconds gauge",
+            f"{METRIC_PREFIX}_uptime_seconds {time.time() - self.started:.3f}"
+        ]
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                lines += [
+                    f"# TYPE {METRIC_PREFIX}_{name} counter",
+                    f"{METRIC_PREFIX}_{name} {value}"
+                ]
+
+            metric = f"{METRIC_PREFIX}_stage_seconds"
+            lines += [
+                f"# HELP {metric} Wall time per pricing pipeline stage",
+                f"# TYPE {metric} histogram"
+            ]
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(h.buckets + ('+Inf',), h.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {h.total:.6f}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=METRICS_FILE):
+        """Atomically write the Prometheus text to a file, e.g. for a node exporter textfile collector"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+        return path
+
+    def reset(self):
+        """Drop all recorded metrics"""
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+# One registry per process, shared by the app, the service and batch jobs
+METRICS = MetricsRegistry()
+timer = METRICS.timer
+timed = METRICS.timed
+
+# ========================================
+# SAMPLING PROFILER
+# ========================================
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval while active"""
+
+    def __init__(self, interval=PROFILE_INTERVAL_SECONDS, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.start = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.seconds = 0.0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        """Sampler thread loop"""
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.thread = threading.Thread(target=self.sample, name="car-profiler", daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop_event.set()
+        self.thread.join()
+        self.seconds = time.perf_counter() - self.start
+        return False
+
+    def top(self, limit=PROFILE_TOP_FUNCTIONS):
+        """Functions by inclusive sample share, the hottest first"""
+        inclusive = Counter()
+        own = Counter()
+        for stack, count in self.stacks.items():
+            for function in set(stack):
+                inclusive[function] += count
+            own[stack[-1]] += count
+        return [
+            {
+                'function': function,
+                'samples': count,
+                'inclusive_pct': count / self.samples * 100,
+                'self_pct': own[function] / self.samples * 100
+            }
+            for function, count in inclusive.most_common(limit)
+        ]
+
+    def collapsed(self):
+        """Stacks in the collapsed format read by flamegraph tools"""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common())
@@ -0,0 +1,196 @@
+# ======================================================
+# SMART CAR PRICING SYSTEM - BACKGROUND JOB MANAGER
+# ======================================================
+#
+# Runs long work (training, cross-validation, bulk pricing, comparisons)
+# outside the Streamlit script run. Jobs are keyed by id so a session only
+# keeps the id across reruns, and results wait in the manager until picked
+# up or, if their session never comes back, until they expire. Each pool
+# has its own workers, so quick pricing jobs never queue behind a training
+# run, and jobs from every session share the same queues.
+#
+# Work functions take a report(fraction, message) callback. Calling it after
+# cancel() raises JobCancelled inside the job, which stops at its next
+# progress report.
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import METRICS
+
+# Workers per pool: training uses every core itself, so one at a time
+JOB_POOLS = {
+    'training': 1,
+    'pricing': 2
+}
+# Finished jobs kept for pick-up before the oldest are forgotten
+MAX_FINISHED_JOBS = 100
+# Finished jobs not picked up within this time are forgotten with their results
+FINISHED_JOB_TTL_SECONDS = 30 * 60
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+class JobCancelled(Exception):
+    """Raised inside a job's progress report once it has been cancelled"""
+
+# ========================================
+# JOB
+# ========================================
+
+class Job:
+    """One background job, its progress and its outcome"""
+
+    def __init__(self, pool, label, session_id=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.pool = pool
+        self.label = label
+        self.session_id = session_id
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = "Queued"
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    @property
+    def is_finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    @property
+    def seconds(self):
+        """Run time so far, or total run time once finished"""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def report(self, fraction, message):
+        """Progress callback handed to the work function, raises JobCancelled once cancelled"""
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.id)
+        self.progress = min(1.0, max(0.0, fraction))
+        self.message = message
+
+    def run(self, work):
+        """Executor entry point, records the outcome instead of raising"""
+        if self.cancel_event.is_set():
+            self.finish("cancelled", "Cancelled before starting")
+            return
+        self.status = "running"
+        self.message = "Starting"
+        self.started = time.time()
+        try:
+            self.result = work(self.report)
+        except JobCancelled:
+            self.finish("cancelled", "Cancelled")
+        except Exception as e:
+            self.error = str(e)
+            self.finish("failed", f"Failed: {str(e)}")
+        else:
+            self.finish("done", "Done")
+
+    def finish(self, status, message):
+        self.status = status
+        self.message = message
+        self.finished = time.time()
+        METRICS.increment(f"jobs_{status}_total")
+        if self.started is not None:
+            METRICS.observe(f"job.{self.pool}", self.finished - self.started)
+
+    def summary(self):
+        """Display row for job lists"""
+        return {
+            'id': self.id,
+            'job': self.label,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'seconds': self.seconds
+        }
+
+# ========================================
+# JOB MANAGER
+# ========================================
+
+class JobManager:
+    """Thread-safe registry of background jobs over one executor per pool"""
+
+    def __init__(self, pools=JOB_POOLS, max_finished=MAX_FINISHED_JOBS, finished_ttl=FINISHED_JOB_TTL_SECONDS):
+        self.executors = {
+            pool: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"car-{pool}")
+            for pool, workers in pools.items()
+        }
+        self.max_finished = max_finished
+        self.finished_ttl = finished_ttl
+        self.lock = threading.Lock()
+        self.registry = {}
+
+    def submit(self, pool, work, label, session_id=None):
+        """Queue work(report) on a pool, returns the job id"""
+        job = Job(pool, label, session_id)
+        with self.lock:
+            self.prune()
+            self.registry[job.id] = job
+        job.future = self.executors[pool].submit(job.run, work)
+        METRICS.increment("jobs_submitted_total")
+        return job.id
+
+    def get(self, job_id):
+        """The job with this id, or None if unknown or already forgotten"""
+        with self.lock:
+            return self.registry.get(job_id)
+
+    def jobs(self, session_id=None):
+        """Jobs of one session (or all), newest first"""
+        with self.lock:
+            self.prune()
+            jobs = [job for job in self.registry.values() if session_id is None or job.session_id == session_id]
+        return sorted(jobs, key=lambda job: job.submitted, reverse=True)
+
+    def queue_position(self, job):
+        """Jobs waiting ahead of a queued job on its pool"""
+        with self.lock:
+            return sum(1 for other in self.registry.values()
+                       if other.pool == job.pool and other.status == "queued" and other.submitted < job.submitted)
+
+    def cancel(self, job_id):
+        """Cancel a job: queued jobs never start, running jobs stop at their next progress report"""
+        job = self.get(job_id)
+        if job is None or job.is_finished:
+            return False
+        job.cancel_event.set()
+        job.message = "Cancelling"
+        if job.future is not None and job.future.cancel():
+            job.finish("cancelled", "Cancelled before starting")
+        return True
+
+    def forget(self, job_id):
+        """Drop a finished job once its result has been picked up"""
+        with self.lock:
+            job = self.registry.get(job_id)
+            if job is not None and job.is_finished:
+                del self.registry[job_id]
+
+    def prune(self):
+        """Forget finished jobs older than finished_ttl and the oldest beyond max_finished, caller holds the lock"""
+        expiry = time.time() - self.finished_ttl
+        finished = sorted((job for job in self.registry.values() if job.is_finished),
+                          key=lambda job: job.finished)
+        overflow = max(0, len(finished) - self.max_finished)
+        for index, job in enumerate(finished):
+            if index < overflow or job.finished < expiry:
+                del self.registry[job.id]
+                METRICS.increment("jobs_expired_total")
+
+    def stats(self):
+        """Job counts by status"""
+        with self.lock:
+            counts = dict.fromkeys(JOB_STATUSES, 0)
+            for job in self.registry.values():
+                counts[job.status] += 1
+        return counts
@@ -0,0 +1,245 @@
+# ======================================================
+# SMART CAR PRICING SYSTEM - MARKET PRICE INGESTION
+# ======================================================
+#
+# Offline pipeline that turns market price snapshots (CSV or saved HTML
+# listing pages) into the memory-mapped index read by pricing_core.
+#
+#   python market_data.py dumps/2026-10-17.csv dumps/listings_page.html
+#
+# Each dump is aggregated into its own small partition, keyed by file name.
+# Re-ingesting an unchanged dump is a no-op, a changed dump replaces only its
+# own partition, and the index is rebuilt from the partition aggregates
+# rather than from the raw listings.
+
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from pricing_core import (
+    MARKET_DATA_DIR, MARKET_INDEX_NAME, ANY_YEAR, ANY_CITY, CSV_CHUNK_SIZE,
+    MarketPriceIndex, market_key_hashes, get_market_index, file_digest
+)
+
+PARTITION_DIR = "partitions"
+MANIFEST_NAME = "manifest.json"
+
+SNAPSHOT_COLUMNS = ['Brand', 'Model', 'Year', 'City', 'Price']
+KEY_COLUMNS = ['Brand', 'Model', 'Year', 'City']
+
+# Header spellings seen in dumps, matched case-insensitively
+COLUMN_ALIASES = {
+    'brand': 'Brand', 'make': 'Brand', 'manufacturer': 'Brand',
+    'model': 'Model',
+    'year': 'Year', 'model_year': 'Year', 'manufacturing_year': 'Year',
+    'city': 'City', 'registration_city': 'City', 'location': 'City',
+    'price': 'Price', 'listing_price': 'Price', 'asking_price': 'Price'
+}
+
+# ========================================
+# SNAPSHOT PARSING
+# ========================================
+
+def normalize_snapshot(df):
+    """Rename aliased columns, coerce types and drop unusable listings"""
+    df = df.rename(columns=lambda c: COLUMN_ALIASES.get(str(c).strip().lower().replace(' ', '_'), c))
+    missing = [c for c in ['Brand', 'Model', 'Price'] if c not in df.columns]
+    if missing:
+        raise ValueError(f"Snapshot is missing columns: {missing}")
+    
+    df = df.dropna(subset=['Brand', 'Model'])
+    
+    # Prices often come formatted, e.g. "₹4,50,000"
+    price = df['Price']
+    if not pd.api.types.is_numeric_dtype(price):
+        price = price.astype(str).str.replace(r'[^\d.]', '', regex=True)
+    
+    snapshot = pd.DataFrame({
+        'Brand': df['Brand'].astype(str).str.strip(),
+        'Model': df['Model'].astype(str).str.strip(),
+        'Year': pd.to_numeric(df['Year'], errors='coerce') if 'Year' in df.columns else np.nan,
+        'City': df['City'].fillna(ANY_CITY).astype(str).str.strip() if 'City' in df.columns else ANY_CITY,
+        'Price': pd.to_numeric(price, errors='coerce')
+    })
+    snapshot = snapshot[snapshot['Price'] > 0]
+    snapshot['Year'] = snapshot['Year'].fillna(ANY_YEAR).astype(np.int64)
+    return snapshot
+
+def read_csv_snapshot(path, chunksize=CSV_CHUNK_SIZE):
+    """Yield normalized chunks of a CSV dump"""
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        yield normalize_snapshot(chunk)
+
+def read_html_snapshot(path):
+    """Yield one normalized frame per listing table in a saved HTML page"""
+    from bs4 import BeautifulSoup
+    
+    with open(path, 'rb') as f:
+        soup = BeautifulSoup(f, 'lxml')
+    
+    for table in soup.find_all('table'):
+        rows = [[cell.get_text(strip=True) for cell in tr.find_all(['th', 'td'])] for tr in table.find_all('tr')]
+        rows = [row for row in rows if row]
+        if len(rows) < 2:
+            continue
+        header, body = rows[0], [row for row in rows[1:] if len(row) == len(rows[0])]
+        try:
+            yield normalize_snapshot(pd.DataFrame(body, columns=header))
+        except ValueError:
+            # Not a listing table (navigation, specs, ...)
+            continue
+
+def read_snapshot(path):
+    """Yield normalized listing frames from a CSV or HTML dump"""
+    name = path.lower()
+    if name.endswith(('.html', '.htm')):
+        return read_html_snapshot(path)
+    if name.endswith(('.csv', '.csv.gz')):
+        return read_csv_snapshot(path)
+    raise ValueError(f"Unsupported snapshot format: {path}")
+
+# ========================================
+# AGGREGATION
+# ========================================
+
+def aggregate_listings(listings):
+    """Mergeable per-key aggregates: count, sum, sum of squares, min and max price"""
+    price = listings['Price'].astype(float)
+    return listings.assign(Price=price, Price_Sq=price * price).groupby(KEY_COLUMNS).agg(
+        count=('Price', 'size'),
+        total=('Price', 'sum'),
+        total_sq=('Price_Sq', 'sum'),
+        low=('Price', 'min'),
+        high=('Price', 'max')
+    ).reset_index()
+
+def combine_aggregates(frames, keys=KEY_COLUMNS):
+    """Merge aggregates of the same keys from several chunks or dumps"""
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame(columns=KEY_COLUMNS + ['count', 'total', 'total_sq', 'low', 'high'])
+    return pd.concat(frames, ignore_index=True).groupby(keys).agg(
+        count=('count', 'sum'),
+        total=('total', 'sum'),
+        total_sq=('total_sq', 'sum'),
+        low=('low', 'min'),
+        high=('high', 'max')
+    ).reset_index()
+
+def aggregate_levels(aggregates):
+    """Aggregates per model/year/city, per model/year and per model, with wildcard keys"""
+    known_year = aggregates['Year'] != ANY_YEAR
+    exact = aggregates[known_year & (aggregates['City'] != ANY_CITY)]
+    by_year = combine_aggregates([aggregates[known_year]], ['Brand', 'Model', 'Year']).assign(City=ANY_CITY)
+    by_model = combine_aggregates([aggregates], ['Brand', 'Model']).assign(Year=ANY_YEAR, City=ANY_CITY)
+    return pd.concat([exact, by_year, by_model], ignore_index=True)
+
+def price_bands(aggregates):
+    """Low/avg/high as the mean plus or minus one standard deviation, within the observed range"""
+    count = aggregates['count'].to_numpy(dtype=float)
+    mean = aggregates['total'].to_numpy() / count
+    std = np.sqrt(np.maximum(aggregates['total_sq'].to_numpy() / count - mean * mean, 0))
+    low = np.maximum(aggregates['low'].to_numpy(), mean - std)
+    high = np.minimum(aggregates['high'].to_numpy(), mean + std)
+    return np.column_stack([low, mean, high]).round().astype(np.int64)
+
+# ========================================
+# MARKET DATA STORE
+# ========================================
+
+class MarketDataStore:
+    """Per-dump partitions plus the merged index, with incremental refresh"""
+
+    def __init__(self, store_dir=MARKET_DATA_DIR):
+        self.store_dir = store_dir
+        self.partition_dir = os.path.join(store_dir, PARTITION_DIR)
+        os.makedirs(self.partition_dir, exist_ok=True)
+
+    def manifest(self):
+        """Ingested dump name -> content digest"""
+        try:
+            with open(os.path.join(self.store_dir, MANIFEST_NAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_manifest(self, manifest):
+        """Write the manifest"""
+        with open(os.path.join(self.store_dir, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+    def partition_path(self, name):
+        """Partition file for a dump name"""
+        return os.path.join(self.partition_dir, re.sub(r'[^\w.-]', '_', name) + ".parquet")
+
+    def ingest(self, paths, log=print):
+        """Aggregate new or changed dumps into partitions and rebuild the index if anything changed"""
+        manifest = self.manifest()
+        summary = {'ingested': [], 'skipped': [], 'listings': 0}
+        
+        for path in paths:
+            name = os.path.basename(path)
+            digest = file_digest(path)
+            if manifest.get(name) == digest:
+                summary['skipped'].append(name)
+                continue
+            
+            # Aggregate chunk by chunk, raw listings never need to fit in memory
+            partials = []
+            for listings in read_snapshot(path):
+                summary['listings'] += len(listings)
+                partials.append(aggregate_listings(listings))
+            combine_aggregates(partials).to_parquet(self.partition_path(name), index=False)
+            
+            manifest[name] = digest
+            summary['ingested'].append(name)
+            log(f"📥 Ingested {name}")
+        
+        self.save_manifest(manifest)
+        if summary['ingested'] or not os.path.exists(os.path.join(self.store_dir, MARKET_INDEX_NAME)):
+            summary['keys'] = self.rebuild_index()
+        return summary
+
+    def remove(self, name):
+        """Drop one dump's partition and rebuild the index"""
+        manifest = self.manifest()
+        manifest.pop(name, None)
+        if os.path.exists(self.partition_path(name)):
+            os.remove(self.partition_path(name))
+        self.save_manifest(manifest)
+        return self.rebuild_index()
+
+    def rebuild_index(self):
+        """Merge the partition aggregates into the memory-mapped index, returns its key count"""
+        partitions = [pd.read_parquet(self.partition_path(name)) for name in self.manifest()]
+        levels = aggregate_levels(combine_aggregates(partitions))
+        
+        hashes = market_key_hashes(levels['Brand'], levels['Model'], levels['Year'], levels['City'])
+        index = MarketPriceIndex.build(hashes, price_bands(levels), levels['count'].to_numpy(dtype=np.int64))
+        index.save(self.store_dir)
+        
+        # Pick up the new file in this process too
+        get_market_index.cache_clear()
+        return len(index)
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest market price snapshots into the market index")
+    parser.add_argument("paths", nargs="*", help="CSV or HTML snapshot files")
+    parser.add_argument("--store", default=MARKET_DATA_DIR)
+    parser.add_argument("--remove", metavar="NAME", help="drop an ingested dump by file name")
+    args = parser.parse_args()
+    
+    store = MarketDataStore(args.store)
+    if args.remove:
+        print(f"🗑️ Removed {args.remove}, index has {store.remove(args.remove):,} keys")
+    summary = store.ingest(args.paths)
+    print(f"✅ {len(summary['ingested'])} ingested ({summary['listings']:,} listings), "
+          f"{len(summary['skipped'])} unchanged"
+          + (f", index has {summary['keys']:,} keys" if 'keys' in summary else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2108 @@
+# ======================================================
+# SMART CAR PRICING SYSTEM - PRICING CORE (NO UI)
+# ======================================================
+#
+# Car database, market prices and CarPricePredictor without any Streamlit
+# dependency, for batch jobs, workers and the HTTP service. pandas, joblib
+# and scikit-learn are imported lazily so importing this module stays fast.
+
+import importlib.util
+import sys
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import nullcontext
+from datetime import datetime
+from functools import cached_property, lru_cache
+
+import numpy as np
+
+from instrumentation import METRICS, timed, timer
+
+logger = logging.getLogger(__name__)
+
+def lazy_import(name):
+    """Return a module that is only really imported on first attribute access"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+pd = lazy_import("pandas")
+joblib = lazy_import("joblib")
+
+# ========================================
+# COMPREHENSIVE CAR DATABASE FOR MANUAL INPUT
+# ========================================
+
+CAR_DATABASE = {
+    'Maruti Suzuki': {
+        'models': ['Alto', 'Alto K10', 'S-Presso', 'Celerio', 'Wagon R', 'Ignis', 'Swift', 'Baleno', 'Dzire', 'Ciaz', 
+                  'Ertiga', 'XL6', 'Vitara Brezza', 'Jimny', 'Fronx', 'Grand Vitara', 'Eeco', 'Omni', 'Celerio X'],
+        'car_types': ['Hatchback', 'Hatchback', 'Hatchback', 'Hatchback', 'Hatchback', 'Hatchback', 'Hatchback', 'Hatchback', 'Sedan', 'Sedan',
+                     'MUV', 'MUV', 'SUV', 'SUV', 'SUV', 'SUV', 'Van', 'Van', 'Hatchback'],
+        'engine_cc': [796, 998, 998, 998, 998, 1197, 1197, 1197, 1197, 1462,
+                     1462, 1462, 1462, 1462, 1197, 1462, 1196, 796, 998],
+        'power_hp': [48, 67, 67, 67, 67, 83, 90, 90, 90, 103,
+                    103, 103, 103, 103, 90, 103, 73, 35, 67],
+        'seats': [5, 5, 5, 5, 5, 5, 5, 5, 5, 5,
+                 7, 6, 5, 5, 5, 5, 5, 8, 5]
+    },
+    'Hyundai': {
+        'models': ['i10', 'i20', 'Aura', 'Grand i10 Nios', 'Verna', 'Creta', 'Venue', 'Alcazar', 'Tucson', 'Kona Electric',
+                  'Santro', 'Xcent', 'Elantra', 'Ioniq 5'],
+        'car_types': ['Hatchback', 'Hatchback', 'Sedan', 'Hatchback', 'Sedan', 'SUV', 'SUV', 'SUV', 'SUV', 'SUV',
+                     'Hatchback', 'Sedan', 'Sedan', 'SUV'],
+        'engine_cc': [1086, 1197, 1197, 1197, 1493, 1493, 1197, 2199, 2199, 0,
+                     1086, 1197, 1999, 0],
+        'power_hp': [69, 83, 83, 83, 115, 115, 83, 148, 148, 136,
+                    69, 83, 152, 217],
+        'seats': [5, 5, 5, 5, 5, 5, 5, 6, 5, 5,
+                 5, 5, 5, 5]
+    },
+    'Tata': {
+        'models': ['Tiago', 'Tigor', 'Altroz', 'Nexon', 'Punch', 'Harrier', 'Safari', 'Nexon EV', 'Tigor EV', 'Tiago EV',
+                  'Indica', 'Indigo', 'Sumo', 'Hexa'],
+        'car_types': ['Hatchback', 'Sedan', 'Hatchback', 'SUV', 'SUV', 'SUV', 'SUV', 'SUV', 'Sedan', 'Hatchback',
+                     'Hatchback', 'Sedan', 'SUV', 'SUV'],
+        'engine_cc': [1199, 1199, 1199, 1199, 1199, 1956, 1956, 0, 0, 0,
+                     1405, 1405, 2179, 2179],
+        'power_hp': [85, 85, 85, 120, 120, 170, 170, 129, 75, 75,
+                    70, 70, 120, 156],
+        'seats': [5, 5, 5, 5, 5, 5, 5, 5, 5, 5,
+                 5, 5, 8, 7]
+    },
+    'Mahindra': {
+        'models': ['Bolero', 'Scorpio', 'XUV300', 'XUV400', 'XUV700', 'Thar', 'Marazzo', 'KUV100', 'TUV300', 'Alturas G4',
+                  'Bolero Neo', 'Scorpio N', 'Verito', 'Xylo'],
+        'car_types': ['SUV', 'SUV', 'SUV', 'SUV', 'SUV', 'SUV', 'MUV', 'Hatchback', 'SUV', 'SUV',
+                     'SUV', 'SUV', 'Sedan', 'MUV'],
+        'engine_cc': [1493, 2179, 1197, 0, 1997, 1997, 1497, 1198, 1493, 2157,
+                     1493, 1997, 1461, 2179],
+        'power_hp': [75, 140, 110, 150, 200, 150, 123, 83, 100, 178,
+                    100, 200, 65, 120],
+        'seats': [7, 7, 5, 5, 7, 4, 8, 5, 7, 7,
+                 7, 7, 5, 8]
+    },
+    'Toyota': {
+        'models': ['Innova Crysta', 'Fortuner', 'Glanza', 'Urban Cruiser Hyryder', 'Camry', 'Vellfire', 'Hilux', 'Etios', 
+                  'Etios Liva', 'Yaris', 'Corolla Altis', 'Innova Hycross'],
+        'car_types': ['MUV', 'SUV', 'Hatchback', 'SUV', 'Sedan', 'MUV', 'Pickup', 'Sedan',
+                     'Hatchback', 'Sedan', 'Sedan', 'MUV'],
+        'engine_cc': [2393, 2694, 1197, 1462, 2487, 2494, 2755, 1496,
+                     1496, 1496, 1798, 1987],
+        'power_hp': [150, 204, 90, 103, 177, 197, 204, 90,
+                    90, 107, 140, 186],
+        'seats': [7, 7, 5, 5, 5, 7, 5, 5,
+                 5, 5, 5, 7]
+    },
+    'Honda': {
+        'models': ['Amaze', 'City', 'Jazz', 'WR-V', 'Elevate', 'Civic', 'CR-V', 'Brio'],
+        'car_types': ['Sedan', 'Sedan', 'Hatchback', 'SUV', 'SUV', 'Sedan', 'SUV', 'Hatchback'],
+        'engine_cc': [1199, 1498, 1199, 1199, 1498, 1799, 1997, 1198],
+        'power_hp': [90, 121, 90, 90, 121, 141, 158, 88],
+        'seats': [5, 5, 5, 5, 5, 5, 5, 5]
+    }
+}
+
+FUEL_TYPES = ["Petrol", "Diesel", "CNG", "Electric", "Hybrid"]
+TRANSMISSIONS = ["Manual", "Automatic", "CVT", "DCT", "AMT"]
+CAR_CONDITIONS = ["Excellent", "Very Good", "Good", "Fair", "Poor"]
+OWNER_TYPES = ["First", "Second", "Third", "Fourth & Above"]
+INSURANCE_STATUS = ["Comprehensive", "Third Party", "Expired", "No Insurance"]
+COLORS = ["White", "Black", "Silver", "Grey", "Red", "Blue", "Brown", "Green", "Yellow", "Orange", "Purple", "Other"]
+CITIES = ["Delhi", "Mumbai", "Bangalore", "Chennai", "Pune", "Hyderabad", "Kolkata", "Ahmedabad", "Surat", "Jaipur", "Lucknow", "Chandigarh"]
+
+# Model feature layout, FEATURES are required on every listing
+FEATURES = ['Brand', 'Model', 'Year', 'Fuel_Type', 'Transmission',
+            'Mileage', 'Engine_cc', 'Power_HP', 'Condition']
+# Optional listing context: Seats and Car_Type default to the catalog specs, the rest to unknown
+CONTEXT_FEATURES = ['Registration_City', 'Owner_Type', 'Insurance_Status', 'Color', 'Seats', 'Car_Type']
+CATEGORICAL_FEATURES = ['Brand', 'Model', 'Fuel_Type', 'Transmission', 'Condition',
+                        'Registration_City', 'Owner_Type', 'Insurance_Status', 'Color', 'Car_Type']
+NUMERICAL_FEATURES = ['Year', 'Mileage', 'Engine_cc', 'Power_HP', 'Seats']
+
+# Target-encoded median training prices: name -> (group columns, coarser level small groups shrink towards),
+# coarsest first so every parent is computed before its children
+AGGREGATE_FEATURES = {
+    'Segment_Price': (['Car_Type'], None),
+    'Segment_City_Price': (['Car_Type', 'Registration_City'], 'Segment_Price'),
+    'Model_Price': (['Brand', 'Model'], 'Segment_Price'),
+    'Model_City_Price': (['Brand', 'Model', 'Registration_City'], 'Model_Price')
+}
+# Listings at which a group's own median and its parent level weigh the same
+AGGREGATE_SMOOTHING = 20
+# Training rows get aggregates fitted on the other folds, so none sees its own price
+AGGREGATE_FOLDS = 5
+
+# Column order of the model feature matrix, models saved before context features use FEATURES
+MODEL_FEATURES = FEATURES + CONTEXT_FEATURES + list(AGGREGATE_FEATURES)
+
+REQUIRED_COLUMNS = FEATURES + ['Price']
+
+# Streaming CSV ingestion, numbers are read as text and coerced per chunk so
+# values like "45,000" or "n/a" never fail the whole file
+CSV_CHUNK_SIZE = 200000
+CSV_DTYPES = {
+    'Brand': 'category',
+    'Model': 'category',
+    'Fuel_Type': 'category',
+    'Transmission': 'category',
+    'Condition': 'category',
+    'Registration_City': 'category',
+    'Owner_Type': 'category',
+    'Insurance_Status': 'category',
+    'Color': 'category',
+    'Car_Type': 'category',
+    'Year': 'str',
+    'Mileage': 'str',
+    'Engine_cc': 'str',
+    'Power_HP': 'str',
+    'Seats': 'str'
+}
+# Nullable integers the numeric columns are downcast to after coercion
+CSV_NUMERIC_DTYPES = {
+    'Year': 'Int16',
+    'Mileage': 'Int32',
+    'Engine_cc': 'Int32',
+    'Power_HP': 'Int32',
+    'Seats': 'Int8'
+}
+INGEST_CACHE_DIR = os.environ.get("CAR_PRICE_INGEST_CACHE_DIR", "ingest_cache")
+
+# Training data preprocessing, feature values outside these ranges are clipped
+# (a None upper bound on Year means next year's models)
+FEATURE_CLIP_RANGES = {
+    'Year': (1990, None),
+    'Mileage': (0, 500000),
+    'Engine_cc': (0, 8000),
+    'Power_HP': (10, 1500),
+    'Seats': (2, 16)
+}
+# Listings priced outside this range are data errors and dropped
+TRAINING_PRICE_RANGE = (10000, 500000000)
+TRAINING_DTYPES = {
+    'Year': np.int16,
+    'Mileage': np.int32,
+    'Engine_cc': np.int32,
+    'Power_HP': np.int32,
+    'Seats': np.int8,
+    'Price': np.float64
+}
+MIN_TRAINING_ROWS = 10
+
+# Valuations kept in the shared prediction cache
+PREDICTION_CACHE_SIZE = 10000
+
+# Random forest training
+N_ESTIMATORS = 100
+TREE_BATCH_SIZE = 10
+INCREMENTAL_TREES = 20
+
+# Model evaluation, holdout and CV sizes are capped so memory stays bounded
+HOLDOUT_FRACTION = 0.2
+MAX_HOLDOUT_ROWS = 200000
+MIN_TRAINING_ROWS_FOR_HOLDOUT = 50
+CV_FOLDS = 5
+CV_SAMPLE_ROWS = 200000
+CV_PARAM_GRID = {'n_estimators': [50, 100], 'max_depth': [10, 15, None]}
+DEFAULT_MODEL_PARAMS = {'n_estimators': N_ESTIMATORS, 'max_depth': 15}
+
+# Histogram gradient boosting, the compact and fast-training alternative backend
+BOOSTING_BATCH_SIZE = 50
+BOOSTING_MODEL_PARAMS = {'max_iter': 300, 'learning_rate': 0.1, 'max_leaf_nodes': 63}
+BOOSTING_PARAM_GRID = {'max_iter': [200, 400], 'learning_rate': [0.05, 0.1]}
+# Native categorical support is limited to this many categories per feature
+BOOSTING_MAX_CATEGORIES = 255
+# Holdout rows used for permutation feature importance
+IMPORTANCE_SAMPLE_ROWS = 5000
+
+DEFAULT_BACKEND = os.environ.get("CAR_PRICE_MODEL_BACKEND", "random_forest")
+
+# Forest compaction, None keeps every tree and every level
+COMPACT_MAX_TREES = None
+COMPACT_MAX_DEPTH = None
+# Rows walked through the compact forest at a time, keeps the (rows, trees) node table small
+COMPACT_BLOCK_ROWS = 2048
+
+# Code given to categorical values the encoders have never seen
+UNSEEN_LABEL_CODE = -1
+# Rows per model.predict call in batch pricing
+PREDICT_CHUNK_SIZE = 100000
+MIN_PRICE = 100000
+
+# Percentiles of the per-tree predictions reported as the low/median/high band
+INTERVAL_PERCENTILES = [10, 50, 90]
+PRICE_BAND_COLUMNS = {
+    'Predicted_Price': 'price',
+    'Price_Low': 'low',
+    'Price_Median': 'median',
+    'Price_High': 'high'
+}
+
+# Depreciation surface grid, precomputed after training on request for depreciation curves
+SURFACE_YEARS = 15
+SURFACE_MILEAGE_BUCKETS = np.array([0, 10000, 25000, 50000, 75000, 100000, 150000, 200000])
+
+# Trained model artifacts, one content-hashed directory per version
+MODEL_STORE_DIR = os.environ.get("CAR_PRICE_MODEL_DIR", "model_store")
+MODEL_ARTIFACT_NAME = "model.joblib"
+LATEST_MODEL_POINTER = "LATEST"
+
+# ========================================
+# CAR SPECIFICATION CATALOG
+# ========================================
+
+# Catalog spec fields and the listing columns they fill
+SPEC_COLUMNS = {
+    'car_type': 'Car_Type',
+    'engine_cc': 'Engine_cc',
+    'power_hp': 'Power_HP',
+    'seats': 'Seats'
+}
+DEFAULT_SPECS = {'car_type': "Unknown", 'engine_cc': 0, 'power_hp': 0, 'seats': 5}
+
+# Listing details assumed for compared cars that don't specify them
+COMPARISON_DEFAULTS = {'Fuel_Type': "Petrol", 'Transmission': "Manual", 'Mileage': 30000}
+
+class CarSpecCatalog:
+    """Columnar table of model specs with a (brand, model) -> row hash index"""
+
+    def __init__(self, car_database):
+        brands = []
+        models = []
+        car_types = []
+        engine_cc = []
+        power_hp = []
+        seats = []
+        for brand, specs in car_database.items():
+            brands.extend([brand] * len(specs['models']))
+            models.extend(specs['models'])
+            car_types.extend(specs['car_types'])
+            engine_cc.extend(specs['engine_cc'])
+            power_hp.extend(specs['power_hp'])
+            seats.extend(specs['seats'])
+        
+        # Categorical columns as categories + codes, so building needs only NumPy
+        self.brand_categories, self.brand_codes = np.unique(np.array(brands, dtype=object), return_inverse=True)
+        self.model = np.array(models, dtype=object)
+        self.car_type_categories, self.car_type_codes = np.unique(np.array(car_types, dtype=object), return_inverse=True)
+        self.engine_cc = np.array(engine_cc, dtype=np.int32)
+        self.power_hp = np.array(power_hp, dtype=np.int16)
+        self.seats = np.array(seats, dtype=np.int8)
+        
+        self.keys = list(zip(brands, models))
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+
+    @cached_property
+    def brand(self):
+        return pd.Categorical.from_codes(self.brand_codes, self.brand_categories)
+
+    @cached_property
+    def car_type(self):
+        return pd.Categorical.from_codes(self.car_type_codes, self.car_type_categories)
+
+    @cached_property
+    def index(self):
+        """(brand, model) MultiIndex for bulk joins, built on first use"""
+        return pd.MultiIndex.from_tuples(self.keys, names=['Brand', 'Model'])
+
+    def __len__(self):
+        return len(self.model)
+
+    def row(self, brand, model):
+        """Return the catalog row of a model, or -1 if it is not in the catalog"""
+        return self.rows.get((brand, model), -1)
+
+    def lookup(self, brand, model):
+        """Return the specs of a model as a dict, or None if it is not in the catalog"""
+        row = self.row(brand, model)
+        if row < 0:
+            return None
+        return {
+            'car_type': self.car_type_categories[self.car_type_codes[row]],
+            'engine_cc': int(self.engine_cc[row]),
+            'power_hp': int(self.power_hp[row]),
+            'seats': int(self.seats[row])
+        }
+
+    def models_frame(self, brand=None, car_type=None):
+        """Catalog models as a Brand/Model/Car_Type DataFrame, optionally for one brand or segment"""
+        brands = self.brand_categories[self.brand_codes]
+        car_types = self.car_type_categories[self.car_type_codes]
+        mask = np.ones(len(self), dtype=bool)
+        if brand is not None:
+            mask &= brands == brand
+        if car_type is not None:
+            mask &= car_types == car_type
+        return pd.DataFrame({'Brand': brands[mask], 'Model': self.model[mask], 'Car_Type': car_types[mask]})
+
+    def enrich(self, df, overwrite=False, specs=tuple(SPEC_COLUMNS)):
+        """Join catalog specs (all, or just specs) onto a DataFrame of listings in one indexed pass"""
+        rows = self.index.get_indexer(pd.MultiIndex.from_arrays([df['Brand'], df['Model']]))
+        matched = rows >= 0
+        
+        enriched = {}
+        for spec in specs:
+            column = SPEC_COLUMNS[spec]
+            values = np.asarray(getattr(self, spec))[rows]
+            values = pd.Series(values, index=df.index).where(matched, DEFAULT_SPECS[spec])
+            if column in df.columns and not overwrite:
+                # Specs already on the listing win, the catalog only fills gaps
+                current = df[column]
+                if isinstance(current.dtype, pd.CategoricalDtype):
+                    current = current.astype(object)
+                values = current.where(current.notna(), values)
+            enriched[column] = values
+        
+        return df.assign(**enriched)
+
+SPEC_CATALOG = CarSpecCatalog(CAR_DATABASE)
+
+def with_listing_context(df):
+    """df with every CONTEXT_FEATURES column, gaps in catalog specs filled from SPEC_CATALOG
+
+    Other missing context is left missing and encoded as unknown.
+    """
+    gaps = [
+        spec for spec, column in SPEC_COLUMNS.items()
+        if column in CONTEXT_FEATURES and (column not in df.columns or df[column].isna().any())
+    ]
+    if gaps:
+        df = SPEC_CATALOG.enrich(df, specs=gaps)
+    missing = {column: None for column in CONTEXT_FEATURES if column not in df.columns}
+    return df.assign(**missing) if missing else df
+
+# ========================================
+# MARKET REFERENCE PRICES
+# ========================================
+
+# Low / average / high market prices per brand and model
+MARKET_PRICE_DATABASE = {
+    'Maruti Suzuki': {
+        'Alto': [150000, 250000, 350000],
+        'Swift': [300000, 450000, 600000],
+        'Baleno': [350000, 500000, 700000],
+        'Dzire': [320000, 480000, 650000],
+        'Vitara Brezza': [500000, 700000, 900000],
+        'Ertiga': [450000, 650000, 850000],
+        'Wagon R': [200000, 300000, 400000],
+        'Celerio': [250000, 350000, 450000]
+    },
+    'Hyundai': {
+        'i10': [250000, 350000, 450000],
+        'i20': [350000, 500000, 650000],
+        'Creta': [600000, 850000, 1100000],
+        'Verna': [450000, 650000, 850000],
+        'Venue': [450000, 600000, 800000]
+    },
+    'Tata': {
+        'Tiago': [250000, 350000, 450000],
+        'Nexon': [450000, 650000, 850000],
+        'Altroz': [350000, 500000, 650000],
+        'Harrier': [800000, 1100000, 1400000],
+        'Safari': [900000, 1200000, 1500000]
+    },
+    'Mahindra': {
+        'Scorpio': [500000, 700000, 900000],
+        'XUV300': [450000, 600000, 800000],
+        'XUV700': [900000, 1200000, 1500000],
+        'Thar': [600000, 850000, 1100000]
+    },
+    'Toyota': {
+        'Innova Crysta': [1000000, 1400000, 1800000],
+        'Fortuner': [1500000, 2000000, 2500000],
+        'Glanza': [350000, 500000, 650000]
+    },
+    'Honda': {
+        'City': [450000, 650000, 850000],
+        'Amaze': [350000, 500000, 650000]
+    }
+}
+
+DEFAULT_MARKET_PRICES = [300000, 500000, 800000]
+
+CONDITION_MULTIPLIERS = {
+    "Excellent": 1.1, "Very Good": 1.0, "Good": 0.9, "Fair": 0.8, "Poor": 0.6
+}
+CONDITION_MULTIPLIER_ARRAY = np.array([CONDITION_MULTIPLIERS[c] for c in CAR_CONDITIONS])
+
+MARKET_PRICE_KEYS = [(brand, model) for brand in MARKET_PRICE_DATABASE for model in MARKET_PRICE_DATABASE[brand]]
+# The default prices go in the last row so a missed lookup (-1) lands on them
+MARKET_PRICE_TABLE = np.array(
+    [MARKET_PRICE_DATABASE[brand][model] for brand, model in MARKET_PRICE_KEYS] + [DEFAULT_MARKET_PRICES],
+    dtype=np.int64
+)
+
+@lru_cache(maxsize=1)
+def get_market_price_index():
+    """(brand, model) MultiIndex matching the rows of MARKET_PRICE_TABLE, built on first use"""
+    return pd.MultiIndex.from_tuples(MARKET_PRICE_KEYS, names=['Brand', 'Model'])
+
+# ========================================
+# INGESTED MARKET PRICE INDEX
+# ========================================
+
+MARKET_DATA_DIR = os.environ.get("CAR_PRICE_MARKET_DIR", "market_store")
+MARKET_INDEX_NAME = "market_index.npy"
+# Wildcards for the per-model and per-model-year aggregation levels
+ANY_YEAR = 0
+ANY_CITY = ""
+# Fewer snapshot listings than this at a finer level fall back to the coarser one
+MIN_MARKET_OBSERVATIONS = 5
+MARKET_INDEX_DTYPE = np.dtype([
+    ('key', '<u8'), ('low', '<i8'), ('avg', '<i8'), ('high', '<i8'), ('count', '<i8')
+])
+
+def market_key_hash(brand, model, year=ANY_YEAR, city=ANY_CITY):
+    """Stable 64-bit hash of a (brand, model, year, city) key, never 0 which marks an empty slot"""
+    key = f"{brand}\x1f{model}\x1f{int(year)}\x1f{city}".encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') | 1
+
+def market_key_hashes(brands, models, years, cities):
+    """market_key_hash for arrays of keys, hashing each distinct key once"""
+    columns = [pd.factorize(np.asarray(values)) for values in (brands, models, years, cities)]
+    if not len(columns[0][0]):
+        return np.zeros(0, dtype=np.uint64)
+    
+    # One mixed-radix code per key, so distinct keys come from a flat integer unique
+    codes = np.zeros(len(columns[0][0]), dtype=np.int64)
+    for column_codes, uniques in columns:
+        codes = codes * len(uniques) + column_codes
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    
+    parts = []
+    for _, uniques in reversed(columns):
+        parts.append(uniques[unique_codes % len(uniques)])
+        unique_codes = unique_codes // len(uniques)
+    hashes = np.fromiter((market_key_hash(*key) for key in zip(*reversed(parts))), dtype=np.uint64, count=len(parts[0]))
+    return hashes[inverse]
+
+class MarketPriceIndex:
+    """Open-addressing hash table of ingested low/avg/high prices, memory-mapped from disk"""
+
+    def __init__(self, table=None):
+        self.table = np.zeros(0, dtype=MARKET_INDEX_DTYPE) if table is None else table
+        self.size = int(np.count_nonzero(self.table['key']))
+
+    @classmethod
+    def build(cls, hashes, prices, counts):
+        """Build the table from unique key hashes, an (n, 3) price array and listing counts"""
+        # Power-of-two capacity at most half full keeps probe chains short
+        capacity = 1 << max(1, int(np.ceil(np.log2(max(2 * len(hashes), 2)))))
+        mask = np.uint64(capacity - 1)
+        table = np.zeros(capacity, dtype=MARKET_INDEX_DTYPE)
+        
+        # Linear probing, vectorized: each round the first pending key on a free slot claims it
+        pending = np.arange(len(hashes))
+        slots = hashes & mask
+        while len(pending):
+            slot = slots[pending]
+            claim = np.zeros(len(pending), dtype=bool)
+            claim[np.unique(slot, return_index=True)[1]] = True
+            claim &= table['key'][slot] == 0
+            
+            placed = pending[claim]
+            table['key'][slot[claim]] = hashes[placed]
+            table['low'][slot[claim]] = prices[placed, 0]
+            table['avg'][slot[claim]] = prices[placed, 1]
+            table['high'][slot[claim]] = prices[placed, 2]
+            table['count'][slot[claim]] = counts[placed]
+            
+            pending = pending[~claim]
+            slots[pending] = (slots[pending] + np.uint64(1)) & mask
+        return cls(table)
+
+    @classmethod
+    def load(cls, store_dir=MARKET_DATA_DIR):
+        """Memory-map the ingested index, or an empty index if nothing was ingested"""
+        path = os.path.join(store_dir, MARKET_INDEX_NAME)
+        if not os.path.exists(path):
+            return cls()
+        return cls(np.load(path, mmap_mode='r'))
+
+    def save(self, store_dir=MARKET_DATA_DIR):
+        """Atomically write the index, readers holding the old file keep their mapping"""
+        os.makedirs(store_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=store_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.asarray(self.table))
+        os.replace(tmp_path, os.path.join(store_dir, MARKET_INDEX_NAME))
+
+    def __len__(self):
+        return self.size
+
+    def find(self, hashes):
+        """Table slot of each key hash, -1 if missing"""
+        slots = np.full(len(hashes), -1, dtype=np.int64)
+        if not self.size:
+            return slots
+        
+        mask = np.uint64(len(self.table) - 1)
+        probe = hashes & mask
+        pending = np.arange(len(hashes))
+        keys = self.table['key']
+        while len(pending):
+            found = keys[probe[pending]]
+            hit = found == hashes[pending]
+            slots[pending[hit]] = probe[pending[hit]]
+            pending = pending[~(hit | (found == 0))]
+            probe[pending] = (probe[pending] + np.uint64(1)) & mask
+        return slots
+
+    def prices(self, brands, models, years=None, cities=None):
+        """(n, 3) low/avg/high prices from the most specific ingested level, plus listing counts (0 = built-in table)"""
+        brands = np.asarray(brands, dtype=object)
+        models = np.asarray(models, dtype=object)
+        rows = get_market_price_index().get_indexer(pd.MultiIndex.from_arrays([brands, models]))
+        prices = MARKET_PRICE_TABLE[rows]
+        counts = np.zeros(len(brands), dtype=np.int64)
+        if not self.size:
+            return prices, counts
+        
+        any_year = np.full(len(brands), ANY_YEAR, dtype=np.int64)
+        any_city = np.full(len(brands), ANY_CITY, dtype=object)
+        levels = [(any_year, any_city)]
+        if years is not None:
+            years = pd.Series(years).fillna(ANY_YEAR).to_numpy(dtype=np.int64)
+            levels.append((years, any_city))
+            if cities is not None:
+                levels.append((years, pd.Series(cities, dtype=object).fillna(ANY_CITY).to_numpy(dtype=object)))
+        
+        # Coarse to fine, so the most specific level with enough listings wins
+        for level_years, level_cities in levels:
+            slots = self.find(market_key_hashes(brands, models, level_years, level_cities))
+            entries = self.table[np.maximum(slots, 0)]
+            hit = (slots >= 0) & (entries['count'] >= MIN_MARKET_OBSERVATIONS)
+            prices[hit] = np.column_stack([entries['low'], entries['avg'], entries['high']])[hit]
+            counts[hit] = entries['count'][hit]
+        return prices, counts
+
+@lru_cache(maxsize=1)
+def get_market_index(store_dir=MARKET_DATA_DIR):
+    """Ingested market price index, memory-mapped once per process"""
+    return MarketPriceIndex.load(store_dir)
+
+# ========================================
+# SIMPLIFIED PRICE PREDICTION ENGINE
+# ========================================
+
+class CarPricePredictor:
+    def __init__(self, backend=DEFAULT_BACKEND):
+        if backend not in MODEL_BACKENDS:
+            raise ValueError(f"Unknown model backend {backend}, choose from {list(MODEL_BACKENDS)}")
+        self.backend = backend
+        self.band_ratios = None
+        self.model = None
+        self.scaler = None
+        self.encoders = {}
+        self.aggregates = None
+        self.features = MODEL_FEATURES
+        self.feature_importance = {}
+        self.is_trained = False
+        self.training_summary = None
+        self.training_records_count = 0
+        self.model_version = None
+        # Unique per fit, identifies unsaved models in cache keys
+        self.fit_id = None
+        self.leaf_table = None
+        self.leaf_table_key = None
+        self.surface = None
+        
+    @property
+    def is_compact(self):
+        """Whether the model has been flattened into a CompactForest"""
+        return isinstance(self.model, CompactForest)
+
+    @timed("market_lookup")
+    def get_live_prices(self, brand, model, year=None, city=None):
+        """Get live prices for car models with proper error handling"""
+        try:
+            # Ingested market snapshots, most specific of model/year/city first
+            prices, counts = get_market_index().prices(
+                [brand], [model],
+                None if year is None else [year],
+                None if city is None else [city]
+            )
+            if counts[0]:
+                return [int(price) for price in prices[0]], [f"Market Snapshots ({int(counts[0]):,} listings)"]
+            
+            # Check if brand exists in database
+            if brand not in MARKET_PRICE_DATABASE:
+                return list(DEFAULT_MARKET_PRICES), ["Market Estimate - Unknown Brand"]
+            
+            # Check if model exists for the brand
+            if model not in MARKET_PRICE_DATABASE[brand]:
+                return list(DEFAULT_MARKET_PRICES), ["Market Estimate - Unknown Model"]
+            
+            # Return the actual prices
+            prices = list(MARKET_PRICE_DATABASE[brand][model])
+            sources = ["Market Database"]
+            return prices, sources
+            
+        except Exception as e:
+            return list(DEFAULT_MARKET_PRICES), ["General Market Average"]
+
+    @timed("csv_load")
+    def load_csv(self, source, streaming=False):
+        """Load CSV data for training, returns the DataFrame and overview stats"""
+        if streaming:
+            df, overview = self.ingest_csv(source)
+        else:
+            df = pd.read_csv(source)
+            overview = {
+                'rows': len(df),
+                'columns': len(df.columns),
+                'missing': int(df.isnull().sum().sum()),
+                'sample': df.head(10),
+                'from_cache': False
+            }
+        logger.info("Loaded %d records from CSV%s", overview['rows'],
+                    " (ingestion cache)" if overview['from_cache'] else "")
+        return df, overview
+
+    @timed("csv_ingest")
+    def ingest_csv(self, source, chunksize=CSV_CHUNK_SIZE, cache_dir=INGEST_CACHE_DIR):
+        """Stream a CSV in chunks with compact dtypes, returns the DataFrame and overview stats"""
+        cache_path = None
+        if cache_dir:
+            cache_path = os.path.join(cache_dir, f"{file_digest(source)}.parquet")
+            if os.path.exists(cache_path):
+                try:
+                    df = pd.read_parquet(cache_path)
+                    overview = {
+                        'rows': len(df),
+                        'columns': len(df.columns),
+                        'missing': int(df.isnull().sum().sum()),
+                        'sample': df.head(10),
+                        'from_cache': True
+                    }
+                    return df, overview
+                except ImportError:
+                    cache_path = None
+        
+        overview = {'rows': 0, 'columns': 0, 'missing': 0, 'sample': None, 'from_cache': False}
+        chunks = []
+        for chunk in pd.read_csv(source, chunksize=chunksize, dtype=CSV_DTYPES):
+            if not chunks:
+                # Fail fast before parsing the rest of the file
+                missing_columns = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+                if missing_columns:
+                    raise ValueError(f"Missing required columns: {missing_columns}")
+                overview['columns'] = len(chunk.columns)
+                overview['sample'] = chunk.head(10)
+            
+            chunk = coerce_csv_numbers(chunk)
+            overview['rows'] += len(chunk)
+            overview['missing'] += int(chunk.isnull().sum().sum())
+            chunks.append(chunk)
+        
+        df = concat_chunks(chunks)
+        
+        if cache_path:
+            try:
+                write_ingest_cache(df, cache_path)
+            except ImportError:
+                pass
+        
+        return df, overview
+
+    def train_from_csv(self, df, n_jobs=-1, progress_callback=None, precompute_surface=False):
+        """Train model from CSV data, returns True on success"""
+        try:
+            logger.info("Training model from %d CSV records", len(df))
+            metrics = self.fit_model(df, n_jobs=n_jobs, progress_callback=progress_callback)
+            logger.info("Model trained from CSV: R² %.3f, MAE ₹%.0f", metrics['r2'], metrics['mae'])
+            if precompute_surface:
+                self.precompute_surface()
+            return True
+            
+        except Exception as e:
+            logger.error("Error training from CSV: %s", e)
+            return False
+
+    def clean_training_data(self, df):
+        """Validate and clean a training DataFrame, keeping only the required columns"""
+        df_clean, _ = preprocess_listings(df)
+        return df_clean
+
+    @timed("train")
+    def fit_model(self, df, n_jobs=-1, progress_callback=None, model_params=None,
+                  holdout_fraction=HOLDOUT_FRACTION):
+        """Train model from a DataFrame without touching the UI, returns training metrics"""
+        report = progress_callback or (lambda fraction, message: None)
+        
+        report(0.0, "Cleaning data")
+        df_clean, summary = preprocess_listings(df)
+        
+        # Hold out a capped random sample for honest metrics, aggregates never see its prices
+        train_rows, holdout_rows = split_holdout(len(df_clean), holdout_fraction)
+        
+        report(0.05, "Encoding features")
+        X, y, self.encoders, self.scaler, self.aggregates = fit_features(df_clean, train_rows)
+        self.features = MODEL_FEATURES
+        # Only the feature matrix is needed from here on
+        del df_clean
+        
+        # Train model, grown from empty so progress can be reported
+        backend = MODEL_BACKENDS[self.backend]
+        params = {**backend.default_params, **(model_params or {})}
+        self.model = backend.create({**params, backend.size_param: 0}, n_jobs, self.encoders, self.features)
+        backend.grow(self.model, X.iloc[train_rows], y.iloc[train_rows], params[backend.size_param],
+                     n_jobs, report, 0.1, 0.9)
+        
+        self.is_trained = True
+        self.training_summary = summary
+        self.training_records_count = len(train_rows)
+        self.model_version = None
+        self.fit_id = uuid.uuid4().hex
+        self.surface = None
+        
+        report(0.9, "Evaluating model")
+        if len(holdout_rows):
+            metrics = self.finish_training(X.iloc[holdout_rows], y.iloc[holdout_rows])
+        else:
+            metrics = self.finish_training(X, y, holdout=False)
+        return {**metrics, 'preprocessing': summary}
+
+    @timed("train_incremental")
+    def update_from_csv(self, df_delta, n_new_trees=INCREMENTAL_TREES, n_jobs=-1, progress_callback=None,
+                        holdout_fraction=HOLDOUT_FRACTION):
+        """Grow the trained model with extra trees fitted on newly appended data"""
+        if not self.is_trained:
+            raise ValueError("Incremental training needs an already trained model")
+        if not MODEL_BACKENDS[self.backend].incremental:
+            # A boosting warm start refits the feature binning the existing trees predict with
+            raise ValueError(f"{MODEL_BACKENDS[self.backend].label} models cannot be updated incrementally, retrain them instead")
+        if self.is_compact:
+            raise ValueError("A compacted model cannot grow new trees, retrain it instead")
+        report = progress_callback or (lambda fraction, message: None)
+        
+        report(0.0, "Cleaning data")
+        df_clean, summary = preprocess_listings(df_delta)
+        
+        # Encoders, scaler and aggregates stay fixed so existing trees keep their meaning
+        report(0.05, "Encoding features")
+        X = self.build_feature_matrix(df_clean)
+        y = df_clean['Price'].to_numpy()
+        
+        train_rows, holdout_rows = split_holdout(len(X), holdout_fraction)
+        
+        MODEL_BACKENDS[self.backend].grow(self.model, X.iloc[train_rows], y[train_rows], n_new_trees,
+                                          n_jobs, report, 0.1, 0.9)
+        
+        self.training_records_count += len(train_rows)
+        self.training_summary = summary
+        self.model_version = None
+        self.fit_id = uuid.uuid4().hex
+        self.surface = None
+        del df_clean
+        
+        report(0.9, "Evaluating model")
+        if len(holdout_rows):
+            metrics = self.finish_training(X.iloc[holdout_rows], y[holdout_rows])
+        else:
+            metrics = self.finish_training(X, y, holdout=False)
+        return {**metrics, 'preprocessing': summary}
+
+    def finish_training(self, X, y, holdout=True):
+        """Evaluate on held-out rows and refresh the backend's band calibration and feature importance"""
+        backend = MODEL_BACKENDS[self.backend]
+        metrics = self.evaluate(X, y, holdout)
+        self.band_ratios = backend.calibrate_bands(self.model, X, y)
+        self.feature_importance = backend.feature_importance(self.model, X, y)
+        return metrics
+
+    def evaluate(self, X, y, holdout=True):
+        """Evaluate model on the given features and targets, predicting in chunks"""
+        from sklearn.metrics import r2_score, mean_absolute_error
+        
+        y_pred = np.concatenate([
+            self.model.predict(X.iloc[start:start + PREDICT_CHUNK_SIZE])
+            for start in range(0, len(X), PREDICT_CHUNK_SIZE)
+        ])
+        return {
+            'r2': r2_score(y, y_pred),
+            'mae': mean_absolute_error(y, y_pred),
+            'holdout_rows': len(X) if holdout else 0
+        }
+
+    @timed("cross_validate")
+    def cross_validate(self, df, n_folds=CV_FOLDS, param_grid=None, n_jobs=-1,
+                       sample_rows=CV_SAMPLE_ROWS, progress_callback=None):
+        """K-fold cross-validation and grid search in parallel processes, on a bounded sample"""
+        from sklearn.model_selection import KFold, ParameterGrid
+        
+        report = progress_callback or (lambda fraction, message: None)
+        
+        report(0.0, "Cleaning data")
+        df_clean = self.clean_training_data(df)
+        if len(df_clean) > sample_rows:
+            df_clean = df_clean.sample(n=sample_rows, random_state=42)
+        
+        report(0.05, "Encoding features")
+        # Every row's aggregates come from the other aggregate folds, never from its own price
+        X, y, encoders, _, _ = fit_features(df_clean)
+        features = list(X.columns)
+        X = X.to_numpy(dtype=np.float64)
+        y = y.to_numpy(dtype=np.float64)
+        
+        backend = MODEL_BACKENDS[self.backend]
+        candidates = list(ParameterGrid(param_grid or {key: [value] for key, value in backend.default_params.items()}))
+        splits = list(KFold(n_splits=n_folds, shuffle=True, random_state=42).split(X))
+        tasks = [
+            joblib.delayed(run_cv_fold)(X, y, train_rows, test_rows, params, candidate, fold, self.backend,
+                                        encoders, features)
+            for candidate, params in enumerate(candidates)
+            for fold, (train_rows, test_rows) in enumerate(splits)
+        ]
+        
+        # One process per fold, each model single-threaded to avoid oversubscription
+        folds = []
+        for result in joblib.Parallel(n_jobs=n_jobs, return_as="generator_unordered")(tasks):
+            folds.append(result)
+            report(0.05 + 0.95 * len(folds) / len(tasks), f"Finished {len(folds)}/{len(tasks)} folds")
+        folds.sort(key=lambda result: (result['candidate'], result['fold']))
+        
+        summary = pd.DataFrame(folds).groupby('candidate').agg(
+            mean_r2=('r2', 'mean'),
+            std_r2=('r2', 'std'),
+            mean_mae=('mae', 'mean'),
+            mean_fit_seconds=('fit_seconds', 'mean')
+        ).reset_index()
+        summary['params'] = [candidates[candidate] for candidate in summary['candidate']]
+        best = int(summary.loc[summary['mean_r2'].idxmax(), 'candidate'])
+        
+        return {
+            'folds': folds,
+            'candidates': summary.to_dict('records'),
+            'best_params': candidates[best],
+            'sample_rows': len(df_clean),
+            'backend': self.backend
+        }
+
+    @timed("surface_precompute")
+    def precompute_surface(self, progress_callback=None, years=SURFACE_YEARS, mileage=SURFACE_MILEAGE_BUCKETS):
+        """Price the whole catalog grid once so interactive queries become tensor lookups"""
+        if not self.is_trained:
+            raise ValueError("The depreciation surface needs a trained model")
+        current_year = datetime.now().year
+        self.surface = DepreciationSurface.compute(
+            self,
+            np.arange(current_year - years + 1, current_year + 1),
+            [fuel for fuel in FUEL_TYPES if fuel in self.encoders['Fuel_Type']],
+            [transmission for transmission in TRANSMISSIONS if transmission in self.encoders['Transmission']],
+            mileage,
+            progress_callback
+        )
+        return self.surface
+
+    @timed("model_compact")
+    def compact_model(self, max_trees=COMPACT_MAX_TREES, max_depth=COMPACT_MAX_DEPTH):
+        """Replace the fitted random forest with flat compact node arrays, returns size and node counts"""
+        import pickle
+        
+        if not self.is_trained or self.backend != ForestBackend.name:
+            raise ValueError("Only a trained random forest can be compacted")
+        if self.is_compact:
+            raise ValueError("Model is already compacted")
+        
+        bytes_before = len(pickle.dumps(self.model, protocol=pickle.HIGHEST_PROTOCOL))
+        nodes_before = sum(estimator.tree_.node_count for estimator in self.model.estimators_)
+        self.model = CompactForest.from_forest(self.model, max_trees, max_depth)
+        self.model_version = None
+        self.fit_id = uuid.uuid4().hex
+        if max_trees is not None or max_depth is not None:
+            # Pruning changes prices, the grid was computed from the full forest
+            self.surface = None
+        
+        return {
+            'trees': len(self.model.roots),
+            'nodes_before': nodes_before,
+            'nodes_after': len(self.model.right),
+            'bytes_before': bytes_before,
+            'bytes_after': self.model.nbytes
+        }
+
+    @timed("model_save")
+    def save_model(self, store_dir=MODEL_STORE_DIR):
+        """Save fitted model, scaler and encoders to a content-hashed artifact directory"""
+        if not self.is_trained:
+            raise ValueError("Cannot save an untrained model")
+        
+        artifact = {
+            'backend': self.backend,
+            'band_ratios': self.band_ratios,
+            'model': self.model,
+            'scaler': self.scaler,
+            'encoders': self.encoders,
+            'aggregates': self.aggregates,
+            'features': self.features,
+            'feature_importance': self.feature_importance,
+            'training_records_count': self.training_records_count,
+            'training_summary': self.training_summary,
+            'surface': self.surface
+        }
+        
+        # Dump uncompressed so plain arrays (compact forests, aggregates, the surface) can be
+        # memory-mapped on load, scikit-learn trees copy theirs into private memory regardless
+        os.makedirs(store_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=store_dir, suffix='.tmp')
+        os.close(fd)
+        joblib.dump(artifact, tmp_path)
+        
+        digest = hashlib.sha256()
+        with open(tmp_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        version = digest.hexdigest()[:16]
+        
+        artifact_dir = os.path.join(store_dir, version)
+        os.makedirs(artifact_dir, exist_ok=True)
+        os.replace(tmp_path, os.path.join(artifact_dir, MODEL_ARTIFACT_NAME))
+        write_latest_model_version(version, store_dir)
+        
+        self.model_version = version
+        return version
+
+    @classmethod
+    @timed("model_load")
+    def load_model(cls, version=None, store_dir=MODEL_STORE_DIR, mmap_mode='r'):
+        """Load a saved model artifact, the latest one if no version is given
+
+        mmap_mode maps the artifact's plain NumPy arrays read-only, so processes
+        share them. Only a compacted random forest is such arrays, a fitted
+        scikit-learn forest or boosting model is unpickled into private memory.
+        """
+        if version is None:
+            version = read_latest_model_version(store_dir)
+            if version is None:
+                raise FileNotFoundError(f"No saved model in {store_dir}")
+        
+        artifact = joblib.load(os.path.join(store_dir, version, MODEL_ARTIFACT_NAME), mmap_mode=mmap_mode)
+        
+        predictor = cls(artifact.get('backend', "random_forest"))
+        predictor.band_ratios = artifact.get('band_ratios')
+        predictor.model = artifact['model']
+        predictor.scaler = artifact['scaler']
+        # Artifacts saved before CategoricalEncoder hold sklearn LabelEncoders
+        predictor.encoders = {
+            feature: encoder if isinstance(encoder, CategoricalEncoder) else CategoricalEncoder(encoder.classes_)
+            for feature, encoder in artifact['encoders'].items()
+        }
+        predictor.aggregates = artifact.get('aggregates')
+        # Artifacts saved before context and aggregate features used the required columns only
+        predictor.features = artifact.get('features', FEATURES)
+        predictor.feature_importance = artifact['feature_importance']
+        predictor.training_records_count = artifact['training_records_count']
+        predictor.training_summary = artifact.get('training_summary')
+        predictor.surface = artifact.get('surface')
+        predictor.is_trained = True
+        predictor.model_version = version
+        return predictor
+
+    def cache_token(self):
+        """Identify the model behind a prediction for cache keys"""
+        if not self.is_trained:
+            return "fallback"
+        return self.model_version or f"unsaved-{self.fit_id}"
+
+    @timed("predict_price")
+    def predict_price(self, input_data, return_interval=False):
+        """Predict car price, or a dict with price and low/median/high band if return_interval"""
+        METRICS.increment("predictions_total")
+        if not self.is_trained:
+            # Use fallback if no model trained
+            return self.fallback_prediction(input_data, return_interval)
+        
+        # Always the model, never the interpolated surface, so single and batch prices agree
+        try:
+            # Same encoding path as predict_batch so single and bulk prices agree
+            input_df = pd.DataFrame([{
+                **{feature: input_data[feature] for feature in FEATURES},
+                **{feature: input_data.get(feature) for feature in CONTEXT_FEATURES}
+            }])
+            X = self.build_feature_matrix(input_df)
+            
+            with timer("model_predict"):
+                if return_interval:
+                    bands = self.price_bands(X)
+                    return {key: int(values[0]) for key, values in bands.items()}
+                
+                # Get prediction
+                prediction = self.model.predict(X)[0]
+                return max(MIN_PRICE, int(prediction))
+            
+        except Exception as e:
+            METRICS.increment("prediction_fallbacks_total")
+            logger.warning("Using fallback prediction: %s", e)
+            return self.fallback_prediction(input_data, return_interval)
+    
+    def valuation(self, input_data):
+        """Price, low/median/high band and confidence for one car"""
+        bands = self.predict_price(input_data, return_interval=True)
+        return {**bands, 'confidence': calculate_confidence(input_data, bands)}
+
+    @timed("fallback")
+    def fallback_prediction(self, input_data, return_interval=False):
+        """Fallback price prediction when model fails"""
+        base_prices, _ = self.get_live_prices(input_data['Brand'], input_data['Model'])
+        base_price = base_prices[1]
+        
+        # Simple calculation based on age and condition
+        current_year = datetime.now().year
+        age = current_year - input_data['Year']
+        age_factor = max(0.3, 1 - (age * 0.1))
+        condition_multiplier = CONDITION_MULTIPLIERS[input_data['Condition']]
+        
+        price = max(MIN_PRICE, int(base_price * age_factor * condition_multiplier))
+        if not return_interval:
+            return price
+        
+        # The market low/high spread, depreciated the same way, is the band
+        return {
+            'price': price,
+            'low': max(MIN_PRICE, int(base_prices[0] * age_factor * condition_multiplier)),
+            'median': price,
+            'high': max(MIN_PRICE, int(base_prices[2] * age_factor * condition_multiplier))
+        }
+
+    @timed("fallback_batch")
+    def fallback_batch(self, df, return_interval=False):
+        """Vectorized fallback prediction for a whole DataFrame of cars"""
+        # Per-model market prices, the age and condition adjustment below covers the year
+        market_prices, _ = get_market_index().prices(df['Brand'], df['Model'])
+        
+        years = pd.to_numeric(df['Year'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        if np.isnan(years).any():
+            rows = list(df.index[np.isnan(years)][:10])
+            raise ValueError(f"Missing or invalid Year in rows: {rows}")
+        age = datetime.now().year - years
+        age_factor = np.maximum(0.3, 1 - (age * 0.1))
+        
+        condition_codes = pd.Categorical(df['Condition'], categories=CAR_CONDITIONS).codes
+        if (condition_codes < 0).any():
+            unknown = sorted(set(df['Condition'][condition_codes < 0].astype(str)))
+            raise ValueError(f"Unknown car conditions: {unknown}")
+        condition_multiplier = CONDITION_MULTIPLIER_ARRAY[condition_codes]
+        
+        price = market_prices[:, 1] * age_factor * condition_multiplier
+        price = np.maximum(MIN_PRICE, price.astype(np.int64))
+        if not return_interval:
+            return price
+        
+        low = market_prices[:, 0] * age_factor * condition_multiplier
+        high = market_prices[:, 2] * age_factor * condition_multiplier
+        return pd.DataFrame({
+            'Predicted_Price': price,
+            'Price_Low': np.maximum(MIN_PRICE, low.astype(np.int64)),
+            'Price_Median': price,
+            'Price_High': np.maximum(MIN_PRICE, high.astype(np.int64))
+        }, index=df.index)
+
+    @timed("compare_cars")
+    def compare_cars(self, cars):
+        """Price any number of cars side by side with real catalog specs, in one batched pass"""
+        # Fuel_Type, Transmission and Mileage are optional, missing ones use COMPARISON_DEFAULTS
+        cars = pd.DataFrame(cars).reset_index(drop=True)
+        for column, default in COMPARISON_DEFAULTS.items():
+            cars[column] = cars[column].fillna(default) if column in cars.columns else default
+        
+        # Real specs for every car in one indexed join, then one vectorized predict,
+        # the model rather than the surface so prices match the prediction page
+        cars = SPEC_CATALOG.enrich(cars, overwrite=True)
+        bands = self.predict_batch(cars, return_interval=True)
+        
+        market_prices, _ = get_market_index().prices(cars['Brand'], cars['Model'], cars['Year'])
+        
+        predicted = bands['Predicted_Price'].to_numpy()
+        return pd.DataFrame({
+            'Car': [f"{brand} {model} ({year})" for brand, model, year in zip(cars['Brand'], cars['Model'], cars['Year'])],
+            'Brand': cars['Brand'],
+            'Model': cars['Model'],
+            'Year': cars['Year'],
+            'Type': cars['Car_Type'],
+            'Engine (cc)': cars['Engine_cc'],
+            'Power (HP)': cars['Power_HP'],
+            'Seats': cars['Seats'],
+            'Condition': cars['Condition'],
+            'Mileage': cars['Mileage'],
+            'Predicted Price': predicted,
+            'Price Low': bands['Price_Low'].to_numpy(),
+            'Price High': bands['Price_High'].to_numpy(),
+            'Market Low': market_prices[:, 0],
+            'Market Average': market_prices[:, 1],
+            'Market High': market_prices[:, 2],
+            'Value Score': np.where(market_prices[:, 1] > 0, predicted / np.maximum(market_prices[:, 1], 1) * 100, 0)
+        })
+
+    def forest_leaf_values(self):
+        """Leaf values of all trees in one flat array plus each tree's offset into it"""
+        key = (id(self.model), len(self.model.estimators_))
+        if self.leaf_table_key != key:
+            values = [estimator.tree_.value[:, 0, 0] for estimator in self.model.estimators_]
+            offsets = np.cumsum([0] + [len(tree_values) for tree_values in values[:-1]])
+            self.leaf_table = (np.concatenate(values), offsets)
+            self.leaf_table_key = key
+        return self.leaf_table
+
+    def per_tree_predictions(self, X):
+        """Predictions of every tree for every row, shape (rows, trees), in one gather"""
+        if self.is_compact:
+            return self.model.per_tree_predictions(X)
+        leaf_values, offsets = self.forest_leaf_values()
+        return leaf_values[self.model.apply(X) + offsets]
+
+    def price_bands(self, X):
+        """Point price and low/median/high band from the model backend"""
+        return MODEL_BACKENDS[self.backend].price_bands(self, X)
+
+    def tree_price_bands(self, X):
+        """Point price and low/median/high percentiles of the per-tree predictions"""
+        per_tree = self.per_tree_predictions(X)
+        low, median, high = np.percentile(per_tree, INTERVAL_PERCENTILES, axis=1)
+        return {
+            'price': np.maximum(MIN_PRICE, per_tree.mean(axis=1).astype(np.int64)),
+            'low': np.maximum(MIN_PRICE, low.astype(np.int64)),
+            'median': np.maximum(MIN_PRICE, median.astype(np.int64)),
+            'high': np.maximum(MIN_PRICE, high.astype(np.int64))
+        }
+
+    def build_feature_matrix(self, df):
+        """Encode, scale and add aggregates to a DataFrame, in this model's feature layout"""
+        return feature_matrix(df, self.encoders, self.scaler, self.aggregates, self.features)
+
+    @timed("predict_batch")
+    def predict_batch(self, df, chunk_size=PREDICT_CHUNK_SIZE, return_interval=False):
+        """Predict prices for a whole DataFrame of cars
+
+        Returns an array of prices, or with return_interval a DataFrame of
+        Predicted_Price, Price_Low, Price_Median and Price_High.
+        """
+        missing_columns = [col for col in FEATURES if col not in df.columns]
+        if missing_columns:
+            raise ValueError(f"Missing required columns: {missing_columns}")
+        
+        METRICS.increment("predicted_rows_total", len(df))
+        if not self.is_trained:
+            return self.fallback_batch(df, return_interval)
+        
+        X = self.build_feature_matrix(df)
+        
+        if return_interval:
+            with timer("model_predict_bands"):
+                chunks = [self.price_bands(X.iloc[start:start + chunk_size]) for start in range(0, len(X), chunk_size)]
+            return pd.DataFrame({
+                column: np.concatenate([chunk[key] for chunk in chunks])
+                for column, key in PRICE_BAND_COLUMNS.items()
+            }, index=df.index)
+        
+        # Predict in chunks to bound memory on very large inputs
+        predictions = np.empty(len(X), dtype=float)
+        with timer("model_predict_batch"):
+            for start in range(0, len(X), chunk_size):
+                stop = start + chunk_size
+                predictions[start:stop] = self.model.predict(X.iloc[start:stop])
+        
+        return np.maximum(MIN_PRICE, predictions.astype(np.int64))
+
+# ========================================
+# CATEGORICAL ENCODING
+# ========================================
+
+class CategoricalEncoder:
+    """Fixed, sorted vocabulary for one categorical column, unseen values get UNSEEN_LABEL_CODE"""
+
+    def __init__(self, categories):
+        self.categories = np.asarray(categories, dtype=object)
+        # Codes only need to hold the vocabulary size plus the reserved code
+        self.dtype = np.int16 if len(self.categories) < np.iinfo(np.int16).max else np.int32
+
+    @classmethod
+    def fit(cls, values):
+        """Vocabulary of the distinct non-null values"""
+        return cls(sorted(pd.unique(pd.Series(values).dropna())))
+
+    @cached_property
+    def index(self):
+        """Hash index from category label to code"""
+        return pd.Index(self.categories)
+
+    def __len__(self):
+        return len(self.categories)
+
+    def __contains__(self, value):
+        return value in self.index
+
+    def transform(self, values):
+        """Codes for a column of labels, UNSEEN_LABEL_CODE for labels outside the vocabulary"""
+        if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+            # Map the few category labels once, then gather by the column's own codes,
+            # missing values (code -1) land on the appended unseen code
+            mapping = np.append(self.index.get_indexer(values.cat.categories), UNSEEN_LABEL_CODE)
+            mapping[mapping < 0] = UNSEEN_LABEL_CODE
+            return mapping.astype(self.dtype)[values.cat.codes.to_numpy()]
+        
+        codes = self.index.get_indexer(values)
+        codes[codes < 0] = UNSEEN_LABEL_CODE
+        return codes.astype(self.dtype)
+
+    def inverse(self, codes):
+        """Labels for codes, None for the unseen code"""
+        codes = np.asarray(codes)
+        labels = np.append(self.categories, None)
+        return labels[np.where(codes < 0, len(self.categories), codes)]
+
+# ========================================
+# MODEL BACKENDS
+# ========================================
+
+class ModelBackend:
+    """How to build, grow, band and explain one kind of estimator"""
+    name = None
+    label = None
+    default_params = {}
+    param_grid = {}
+    # Parameter counting the trees, and how many to add between progress reports
+    size_param = None
+    batch_size = None
+    # Whether update_from_csv can add trees fitted on new data to a trained model
+    incremental = False
+
+    def create(self, params, n_jobs, encoders, features):
+        """Unfitted estimator for the given parameters and feature matrix columns"""
+        raise NotImplementedError
+
+    def threads(self, n_jobs):
+        """Context limiting native threads while fitting, a no-op unless overridden"""
+        return nullcontext()
+
+    def grow(self, model, X, y, n_new, n_jobs, report, start_fraction, end_fraction):
+        """Add n_new trees with warm starts, reporting progress after each batch"""
+        current = model.get_params()[self.size_param]
+        target = current + n_new
+        model.set_params(warm_start=True)
+        with self.threads(n_jobs):
+            while current < target:
+                current = min(target, current + self.batch_size)
+                model.set_params(**{self.size_param: current})
+                model.fit(X, y)
+                done = 1 - (target - current) / n_new
+                report(start_fraction + (end_fraction - start_fraction) * done,
+                       f"Trained {current}/{target} trees")
+        model.set_params(warm_start=False)
+
+    def calibrate_bands(self, model, X, y):
+        """Anything price_bands needs from held-out rows, stored with the model"""
+        return None
+
+    def price_bands(self, predictor, X):
+        """Dict of price/low/median/high arrays"""
+        raise NotImplementedError
+
+    def feature_importance(self, model, X, y):
+        """Feature name -> importance, summing to 1"""
+        raise NotImplementedError
+
+class ForestBackend(ModelBackend):
+    """RandomForestRegressor, bands from the spread of the per-tree predictions"""
+    name = "random_forest"
+    label = "🌲 Random Forest"
+    default_params = DEFAULT_MODEL_PARAMS
+    param_grid = CV_PARAM_GRID
+    size_param = 'n_estimators'
+    batch_size = TREE_BATCH_SIZE
+    incremental = True
+
+    def create(self, params, n_jobs, encoders, features):
+        from sklearn.ensemble import RandomForestRegressor
+        return RandomForestRegressor(random_state=42, n_jobs=n_jobs, **params)
+
+    def grow(self, model, X, y, n_new, n_jobs, report, start_fraction, end_fraction):
+        model.set_params(n_jobs=n_jobs)
+        super().grow(model, X, y, n_new, n_jobs, report, start_fraction, end_fraction)
+
+    def price_bands(self, predictor, X):
+        return predictor.tree_price_bands(X)
+
+    def feature_importance(self, model, X, y):
+        return dict(zip(X.columns, model.feature_importances_))
+
+class BoostingBackend(ModelBackend):
+    """HistGradientBoostingRegressor with native categoricals, bands from held-out residual ratios"""
+    name = "hist_gradient_boosting"
+    label = "⚡ Histogram Gradient Boosting"
+    default_params = BOOSTING_MODEL_PARAMS
+    param_grid = BOOSTING_PARAM_GRID
+    size_param = 'max_iter'
+    batch_size = BOOSTING_BATCH_SIZE
+
+    def create(self, params, n_jobs, encoders, features):
+        from sklearn.ensemble import HistGradientBoostingRegressor
+        # Encoded categoricals go in as native categories, unseen codes (-1) count as missing
+        categorical = [
+            feature in encoders and len(encoders[feature]) <= BOOSTING_MAX_CATEGORIES
+            for feature in features
+        ]
+        return HistGradientBoostingRegressor(
+            categorical_features=categorical, early_stopping=False, random_state=42, **params
+        )
+
+    def threads(self, n_jobs):
+        # Boosting is multithreaded with OpenMP rather than joblib
+        from threadpoolctl import threadpool_limits
+        return threadpool_limits(limits=None if n_jobs == -1 else n_jobs, user_api='openmp')
+
+    def calibrate_bands(self, model, X, y):
+        # Actual / predicted on held-out rows, so bands scale with the price
+        predicted = np.maximum(model.predict(X), 1)
+        return np.percentile(np.asarray(y) / predicted, INTERVAL_PERCENTILES)
+
+    def price_bands(self, predictor, X):
+        price = predictor.model.predict(X)
+        ratios = predictor.band_ratios if predictor.band_ratios is not None else np.ones(len(INTERVAL_PERCENTILES))
+        low, median, high = (price * ratio for ratio in ratios)
+        return {
+            'price': np.maximum(MIN_PRICE, price.astype(np.int64)),
+            'low': np.maximum(MIN_PRICE, low.astype(np.int64)),
+            'median': np.maximum(MIN_PRICE, median.astype(np.int64)),
+            'high': np.maximum(MIN_PRICE, high.astype(np.int64))
+        }
+
+    def feature_importance(self, model, X, y):
+        # No impurity importances for boosting, permute features on a holdout sample instead
+        from sklearn.inspection import permutation_importance
+        
+        rows = np.random.default_rng(42).permutation(len(X))[:IMPORTANCE_SAMPLE_ROWS]
+        result = permutation_importance(model, X.iloc[rows], np.asarray(y)[rows], n_repeats=3, random_state=42)
+        importance = np.maximum(result.importances_mean, 0)
+        total = importance.sum()
+        return dict(zip(X.columns, (importance / total if total > 0 else importance).tolist()))
+
+MODEL_BACKENDS = {backend.name: backend for backend in (ForestBackend(), BoostingBackend())}
+
+@timed("backend_report")
+def compare_backends(df, backends=None, n_jobs=-1, progress_callback=None, predict_rows=PREDICT_CHUNK_SIZE):
+    """Train every backend on the same data, returns fit time, predict throughput, size and holdout accuracy"""
+    import pickle
+    
+    report = progress_callback or (lambda fraction, message: None)
+    backends = list(backends or MODEL_BACKENDS)
+    sample = CarPricePredictor().clean_training_data(df).head(predict_rows)
+    
+    results = []
+    for i, name in enumerate(backends):
+        def backend_report(fraction, message, i=i):
+            report((i + fraction * 0.9) / len(backends), f"{MODEL_BACKENDS[name].label}: {message}")
+        
+        predictor = CarPricePredictor(backend=name)
+        start = time.perf_counter()
+        metrics = predictor.fit_model(df, n_jobs=n_jobs, progress_callback=backend_report)
+        fit_seconds = time.perf_counter() - start
+        
+        backend_report(0.95, "Measuring prediction throughput")
+        start = time.perf_counter()
+        predictor.predict_batch(sample)
+        predict_seconds = time.perf_counter() - start
+        
+        results.append({
+            'backend': name,
+            'label': MODEL_BACKENDS[name].label,
+            'training_rows': predictor.training_records_count,
+            'fit_seconds': fit_seconds,
+            'predict_rows_per_second': len(sample) / predict_seconds,
+            'model_bytes': len(pickle.dumps(predictor.model, protocol=pickle.HIGHEST_PROTOCOL)),
+            'r2': metrics['r2'],
+            'mae': metrics['mae'],
+            'holdout_rows': metrics['holdout_rows']
+        })
+    report(1.0, "Done")
+    return results
+
+# ========================================
+# COMPACT FOREST
+# ========================================
+
+class CompactForest:
+    """Random forest flattened into a few compact node arrays, evaluated level by level in NumPy
+
+    Nodes of all trees share one array in per-tree preorder, so a split's
+    left child is always the next node and only the right child is stored.
+    Leaves point right to themselves with a -inf threshold, so walking every
+    row a fixed number of levels leaves each one parked on its leaf.
+    """
+
+    def __init__(self, roots, feature, threshold, right, value, depth):
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.right = right
+        self.value = value
+        self.depth = depth
+
+    @classmethod
+    def from_forest(cls, forest, max_trees=None, max_depth=None):
+        """Flatten a fitted RandomForestRegressor, keeping at most max_trees trees of at most max_depth levels"""
+        roots, features, thresholds, rights, values = [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in forest.estimators_[:max_trees]:
+            tree = estimator.tree_
+            node_depth = tree_node_depths(tree, max_depth)
+            kept = np.flatnonzero(node_depth >= 0)
+            new_ids = np.full(tree.node_count, -1, dtype=np.int64)
+            new_ids[kept] = np.arange(len(kept)) + offset
+            
+            # Nodes on the depth limit become leaves holding their subtree's mean
+            leaf = (tree.children_left[kept] < 0) | (node_depth[kept] == max_depth)
+            right = np.where(leaf, new_ids[kept], new_ids[tree.children_right[kept]])
+            
+            roots.append(offset)
+            features.append(np.where(leaf, 0, tree.feature[kept]))
+            thresholds.append(np.where(leaf, -np.inf, float32_floor(tree.threshold[kept])))
+            rights.append(right)
+            values.append(tree.value[kept, 0, 0])
+            offset += len(kept)
+            depth = max(depth, int(node_depth.max()))
+        
+        return cls(
+            np.array(roots, dtype=np.int32),
+            np.concatenate(features).astype(np.int8),
+            np.concatenate(thresholds).astype(np.float32),
+            np.concatenate(rights).astype(np.int32),
+            np.concatenate(values).astype(np.float32),
+            depth
+        )
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.roots, self.feature, self.threshold, self.right, self.value))
+
+    def apply(self, X):
+        """Leaf node of every tree for every row, shape (rows, trees)"""
+        X = np.asarray(X, dtype=np.float32)
+        leaves = np.empty((len(X), len(self.roots)), dtype=np.int32)
+        for start in range(0, len(X), COMPACT_BLOCK_ROWS):
+            block = X[start:start + COMPACT_BLOCK_ROWS]
+            # Flat index of each row's first feature, plus the node's feature picks the value
+            row_offsets = (np.arange(len(block)) * block.shape[1])[:, None]
+            flat = block.ravel()
+            nodes = np.broadcast_to(self.roots, (len(block), len(self.roots))).copy()
+            for _ in range(self.depth):
+                # take() skips fancy indexing's bounds and broadcasting machinery
+                go_left = flat.take(row_offsets + self.feature.take(nodes)) <= self.threshold.take(nodes)
+                nodes = np.where(go_left, nodes + 1, self.right.take(nodes))
+            leaves[start:start + len(block)] = nodes
+        return leaves
+
+    def per_tree_predictions(self, X):
+        """Predictions of every tree for every row, shape (rows, trees)"""
+        return self.value[self.apply(X)]
+
+    def predict(self, X):
+        """Mean of the tree predictions, like RandomForestRegressor.predict"""
+        return self.per_tree_predictions(X).mean(axis=1, dtype=np.float64)
+
+def tree_node_depths(tree, max_depth=None):
+    """Depth of every node of a fitted sklearn tree, -1 for nodes below max_depth"""
+    depths = np.full(tree.node_count, -1, dtype=np.int64)
+    depths[0] = 0
+    level = np.array([0])
+    for depth in range(1, tree.node_count):
+        if max_depth is not None and depth > max_depth:
+            break
+        children = np.concatenate([tree.children_left[level], tree.children_right[level]])
+        level = children[children >= 0]
+        if not len(level):
+            break
+        depths[level] = depth
+    return depths
+
+def float32_floor(values):
+    """Largest float32 at or below each value, so float32 x <= result exactly when x <= value"""
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+# ========================================
+# TRAINING DATA PREPROCESSING
+# ========================================
+
+def compact_categorical(values):
+    """Categorical of trimmed string labels, empty labels count as missing"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, labels = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, labels = pd.factorize(values)
+    
+    # Clean the few distinct labels rather than every row, trimming may merge some
+    labels = pd.Index(labels.astype(str)).str.strip()
+    label_codes, clean_labels = pd.factorize(labels.where(labels != ""))
+    return pd.Categorical.from_codes(np.append(label_codes, -1)[codes], categories=clean_labels)
+
+def duplicate_rows(df):
+    """Mask of rows repeating an earlier row, like df.duplicated() but in a fraction of the memory"""
+    # One 64-bit hash per row, full comparison only among rows whose hashes repeat
+    hashes = pd.Series(pd.util.hash_pandas_object(df, index=False).to_numpy())
+    candidates = np.flatnonzero(hashes.duplicated(keep=False).to_numpy())
+    duplicates = np.zeros(len(df), dtype=bool)
+    if len(candidates):
+        duplicates[candidates] = df.iloc[candidates].duplicated().to_numpy()
+    return duplicates
+
+@timed("preprocess")
+def preprocess_listings(df, min_rows=MIN_TRAINING_ROWS):
+    """Required and context columns only, coerced to compact dtypes, validated, clipped and deduplicated
+
+    Returns the clean frame and a small summary of what was dropped or
+    clipped. Rows are dropped only for gaps in required columns, gaps in
+    the optional context columns are filled from the catalog or left
+    unknown, and other columns are never looked at.
+    """
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {missing_columns}")
+    df = with_listing_context(df)
+    
+    # One coercion pass per column, unparseable numbers become NaN
+    columns = {}
+    for column in REQUIRED_COLUMNS + CONTEXT_FEATURES:
+        if column in CATEGORICAL_FEATURES:
+            columns[column] = compact_categorical(df[column])
+        else:
+            columns[column] = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    # Unparseable seat counts get the usual five
+    columns['Seats'][np.isnan(columns['Seats'])] = DEFAULT_SPECS['seats']
+    
+    missing = np.zeros(len(df), dtype=bool)
+    for column in REQUIRED_COLUMNS:
+        values = columns[column]
+        missing |= values.codes < 0 if column in CATEGORICAL_FEATURES else np.isnan(values)
+    
+    low, high = TRAINING_PRICE_RANGE
+    price = columns['Price']
+    invalid = ~missing & ((price < low) | (price > high))
+    keep = np.flatnonzero(~(missing | invalid))
+    
+    # Clip only the kept rows, in place on the coerced copies
+    clipped = 0
+    for column, (low, high) in FEATURE_CLIP_RANGES.items():
+        values = columns[column][keep]
+        high = datetime.now().year + 1 if high is None else high
+        clipped += int(np.count_nonzero((values < low) | (values > high)))
+        columns[column] = np.clip(values, low, high)
+    
+    df_clean = pd.DataFrame({
+        column: values[keep].remove_unused_categories() if column in CATEGORICAL_FEATURES
+        else values.astype(TRAINING_DTYPES[column]) if column in FEATURE_CLIP_RANGES
+        else values[keep].astype(TRAINING_DTYPES[column])
+        for column, values in columns.items()
+    })
+    
+    # The same listing posted twice would count double
+    duplicates = duplicate_rows(df_clean)
+    n_duplicates = int(duplicates.sum())
+    if n_duplicates:
+        df_clean = df_clean[~duplicates].reset_index(drop=True)
+    
+    if len(df_clean) < min_rows:
+        raise ValueError(f"Not enough data after cleaning. Need at least {min_rows} records.")
+    
+    summary = {
+        'rows_in': len(df),
+        'rows_kept': len(df_clean),
+        'dropped_missing': int(missing.sum()),
+        'dropped_invalid_price': int(invalid.sum()),
+        'dropped_duplicates': n_duplicates,
+        'clipped_values': clipped,
+        'price': {
+            'min': float(df_clean['Price'].min()),
+            'median': float(df_clean['Price'].median()),
+            'max': float(df_clean['Price'].max())
+        },
+        'ranges': {column: [int(df_clean[column].min()), int(df_clean[column].max())] for column in NUMERICAL_FEATURES},
+        'categories': {column: len(df_clean[column].cat.categories) for column in CATEGORICAL_FEATURES},
+        'memory_bytes': int(df_clean.memory_usage(deep=True).sum())
+    }
+    return df_clean, summary
+
+# ========================================
+# TARGET-ENCODED AGGREGATES
+# ========================================
+
+class PriceAggregates:
+    """Median training price per group of encoded categoricals, stored as sorted lookup arrays
+
+    Each AGGREGATE_FEATURES level maps a mixed-radix code of its group
+    columns to the group's median price and listing count. Lookups are a
+    binary search per row, and small groups shrink towards their parent
+    level, so a model seen twice in a city prices close to the model overall.
+    """
+
+    def __init__(self, radix, keys, medians, counts, global_median):
+        # Vocabulary size + 1 per group column, the extra code is for unseen values
+        self.radix = radix
+        self.keys = keys
+        self.medians = medians
+        self.counts = counts
+        self.global_median = global_median
+
+    @staticmethod
+    def group_codes(codes, columns, radix):
+        """One int64 group code per row from the columns' encoder codes"""
+        group = np.zeros(len(codes[columns[0]]), dtype=np.int64)
+        for column in columns:
+            # Unseen values (code -1) form a group of their own
+            group = group * radix[column] + (codes[column].astype(np.int64) + 1)
+        return group
+
+    @classmethod
+    def fit(cls, codes, prices, radix):
+        """One grouped median pass per level over encoded training rows"""
+        prices = pd.Series(prices, dtype=float)
+        keys, medians, counts = {}, {}, {}
+        for level, (columns, _) in AGGREGATE_FEATURES.items():
+            groups = prices.groupby(cls.group_codes(codes, columns, radix)).agg(['median', 'size'])
+            keys[level] = groups.index.to_numpy(dtype=np.int64)
+            medians[level] = groups['median'].to_numpy(dtype=np.float32)
+            counts[level] = groups['size'].to_numpy(dtype=np.int32)
+        return cls(radix, keys, medians, counts, float(prices.median()))
+
+    def transform(self, codes):
+        """Smoothed median price columns for encoded rows, looked up rather than recomputed"""
+        columns = {}
+        for level, (group_columns, parent) in AGGREGATE_FEATURES.items():
+            group = self.group_codes(codes, group_columns, self.radix)
+            keys = self.keys[level]
+            slots = np.minimum(np.searchsorted(keys, group), len(keys) - 1)
+            counts = np.where(keys[slots] == group, self.counts[level][slots], 0)
+            prior = columns[parent] if parent else self.global_median
+            columns[level] = ((counts * self.medians[level][slots] + AGGREGATE_SMOOTHING * prior)
+                              / (counts + AGGREGATE_SMOOTHING)).astype(np.float32)
+        return columns
+
+def aggregate_codes(df, encoders):
+    """Encoder codes of every column an aggregate level groups by"""
+    columns = dict.fromkeys(column for group_columns, _ in AGGREGATE_FEATURES.values() for column in group_columns)
+    return {column: encoders[column].transform(df[column]) for column in columns}
+
+def out_of_fold_aggregates(codes, prices, radix, n_folds=AGGREGATE_FOLDS, seed=42):
+    """Aggregate columns for training rows, each fold looked up in aggregates fitted on the other folds"""
+    folds = np.random.default_rng(seed).permutation(len(prices)) % n_folds
+    columns = {level: np.empty(len(prices), dtype=np.float32) for level in AGGREGATE_FEATURES}
+    for fold in range(n_folds):
+        rows = folds == fold
+        aggregates = PriceAggregates.fit({column: values[~rows] for column, values in codes.items()},
+                                         prices[~rows], radix)
+        for level, values in aggregates.transform({column: values[rows] for column, values in codes.items()}).items():
+            columns[level][rows] = values
+    return columns
+
+# ========================================
+# TRAINING HELPERS
+# ========================================
+
+def fit_features(df_clean, train_rows=None):
+    """Fit encoders, scaler and price aggregates on cleaned data, returns (X, y, encoders, scaler, aggregates)
+
+    Aggregates are fitted on train_rows only (default all rows). Those rows
+    get out-of-fold aggregate values, any others the fitted lookup, as at
+    inference.
+    """
+    from sklearn.preprocessing import StandardScaler
+    
+    encoders = {feature: CategoricalEncoder.fit(df_clean[feature]) for feature in CATEGORICAL_FEATURES}
+    scaler = StandardScaler().fit(df_clean[NUMERICAL_FEATURES].astype(float))
+    
+    train_rows = np.arange(len(df_clean)) if train_rows is None else train_rows
+    prices = df_clean['Price'].to_numpy(dtype=float)[train_rows]
+    codes = {column: values[train_rows] for column, values in aggregate_codes(df_clean, encoders).items()}
+    radix = {column: len(encoders[column]) + 1 for column in codes}
+    with timer("aggregate_fit"):
+        aggregates = PriceAggregates.fit(codes, prices, radix)
+        out_of_fold = out_of_fold_aggregates(codes, prices, radix)
+    
+    X = feature_matrix(df_clean, encoders, scaler, aggregates)
+    for level, values in out_of_fold.items():
+        column = X[level].to_numpy(copy=True)
+        column[train_rows] = values
+        X[level] = column
+    return X, df_clean['Price'], encoders, scaler, aggregates
+
+def feature_matrix(df, encoders, scaler, aggregates=None, features=MODEL_FEATURES):
+    """Encode, scale and look up aggregates for a DataFrame into the model feature matrix, in features order"""
+    # Columns are built once and assembled without copying, df itself is never modified
+    if any(feature in CONTEXT_FEATURES for feature in features):
+        df = with_listing_context(df)
+    categorical = [feature for feature in features if feature in encoders]
+    numerical = [feature for feature in features if feature in NUMERICAL_FEATURES]
+    with timer("encode"):
+        columns = {feature: encoders[feature].transform(df[feature]) for feature in categorical}
+    with timer("scale"):
+        # StandardScaler.transform without its per-call input validation
+        scaled = (df[numerical].to_numpy(dtype=float) - scaler.mean_) / scaler.scale_
+        columns.update(zip(numerical, scaled.T))
+    if aggregates is not None:
+        with timer("aggregate_lookup"):
+            columns.update(aggregates.transform(columns))
+    return pd.DataFrame({feature: columns[feature] for feature in features}, copy=False)
+
+def split_holdout(n_rows, holdout_fraction=HOLDOUT_FRACTION, max_holdout_rows=MAX_HOLDOUT_ROWS, seed=42):
+    """Split row positions into (train, holdout), the holdout capped at max_holdout_rows"""
+    n_holdout = min(int(n_rows * holdout_fraction), max_holdout_rows)
+    if n_rows - n_holdout < MIN_TRAINING_ROWS_FOR_HOLDOUT or n_holdout == 0:
+        # Too little data to spare, evaluate in-sample instead
+        return np.arange(n_rows), np.array([], dtype=np.int64)
+    
+    positions = np.random.default_rng(seed).permutation(n_rows)
+    return np.sort(positions[n_holdout:]), np.sort(positions[:n_holdout])
+
+def run_cv_fold(X, y, train_rows, test_rows, params, candidate, fold, backend, encoders, features):
+    """Fit and score one candidate on one fold, runs in a worker process"""
+    from sklearn.metrics import r2_score, mean_absolute_error
+    
+    model = MODEL_BACKENDS[backend].create(params, 1, encoders, features)
+    start = time.perf_counter()
+    model.fit(X[train_rows], y[train_rows])
+    fit_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    y_pred = model.predict(X[test_rows])
+    predict_seconds = time.perf_counter() - start
+    
+    return {
+        'candidate': candidate,
+        'fold': fold,
+        'params': params,
+        'train_rows': len(train_rows),
+        'test_rows': len(test_rows),
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds,
+        'r2': r2_score(y[test_rows], y_pred),
+        'mae': mean_absolute_error(y[test_rows], y_pred)
+    }
+
+# ========================================
+# DEPRECIATION SURFACE
+# ========================================
+
+class DepreciationSurface:
+    """Dense tensor of price bands over catalog models x years x conditions x fuels x transmissions x mileage"""
+    # Context features the model uses, the grid holds catalog specs and unknown city, owner, insurance and color
+    context = ()
+
+    def __init__(self, years, fuels, transmissions, mileage, values):
+        self.years = np.asarray(years)
+        self.fuels = list(fuels)
+        self.transmissions = list(transmissions)
+        self.mileage = np.asarray(mileage)
+        # Last axis holds price/low/median/high in PRICE_BAND_COLUMNS order
+        self.values = values
+
+    @property
+    def shape(self):
+        return (len(SPEC_CATALOG), len(self.years), len(CAR_CONDITIONS),
+                len(self.fuels), len(self.transmissions), len(self.mileage))
+
+    def grid(self):
+        """Every grid point as a listings DataFrame, in tensor order"""
+        model, year, condition, fuel, transmission, mileage = np.unravel_index(
+            np.arange(int(np.prod(self.shape))), self.shape
+        )
+        return pd.DataFrame({
+            'Brand': SPEC_CATALOG.brand_categories[SPEC_CATALOG.brand_codes][model],
+            'Model': SPEC_CATALOG.model[model],
+            'Year': self.years[year],
+            'Fuel_Type': np.asarray(self.fuels, dtype=object)[fuel],
+            'Transmission': np.asarray(self.transmissions, dtype=object)[transmission],
+            'Mileage': self.mileage[mileage],
+            'Engine_cc': SPEC_CATALOG.engine_cc[model],
+            'Power_HP': SPEC_CATALOG.power_hp[model],
+            'Condition': np.asarray(CAR_CONDITIONS, dtype=object)[condition]
+        })
+
+    @classmethod
+    def compute(cls, predictor, years, fuels, transmissions, mileage, progress_callback=None):
+        """Evaluate the model over the full grid in batched predicts"""
+        report = progress_callback or (lambda fraction, message: None)
+        surface = cls(years, fuels, transmissions, mileage, None)
+        surface.context = [feature for feature in predictor.features if feature in CONTEXT_FEATURES]
+        grid = surface.grid()
+        
+        values = np.empty((len(grid), len(PRICE_BAND_COLUMNS)), dtype=np.int32)
+        for start in range(0, len(grid), PREDICT_CHUNK_SIZE):
+            report(start / len(grid), f"Precomputing depreciation surface ({start:,}/{len(grid):,})")
+            chunk = grid.iloc[start:start + PREDICT_CHUNK_SIZE]
+            values[start:start + len(chunk)] = predictor.predict_batch(chunk, return_interval=True).to_numpy()
+        report(1.0, "Depreciation surface ready")
+        
+        surface.values = values.reshape(surface.shape + (len(PRICE_BAND_COLUMNS),))
+        return surface
+
+    def mileage_weights(self, mileage):
+        """Lower bucket index and interpolation weight towards the next bucket"""
+        upper = np.clip(np.searchsorted(self.mileage, mileage, side='right'), 1, len(self.mileage) - 1)
+        lower = upper - 1
+        weight = (mileage - self.mileage[lower]) / (self.mileage[upper] - self.mileage[lower])
+        return lower, weight
+
+    @timed("surface_lookup")
+    def value(self, input_data):
+        """Interpolated price band dict for one car, None if it is off the grid"""
+        row = SPEC_CATALOG.row(input_data['Brand'], input_data['Model'])
+        year = int(input_data['Year']) - int(self.years[0])
+        mileage = float(input_data['Mileage'])
+        if (row < 0 or not 0 <= year < len(self.years)
+                or not self.mileage[0] <= mileage <= self.mileage[-1]
+                or input_data['Condition'] not in CAR_CONDITIONS
+                or input_data['Fuel_Type'] not in self.fuels
+                or input_data['Transmission'] not in self.transmissions):
+            return None
+        # Custom specs and known listing context are not on the grid
+        if (input_data.get('Engine_cc', SPEC_CATALOG.engine_cc[row]) != SPEC_CATALOG.engine_cc[row]
+                or input_data.get('Power_HP', SPEC_CATALOG.power_hp[row]) != SPEC_CATALOG.power_hp[row]):
+            return None
+        specs = self.catalog_context()
+        for column in self.context:
+            value = input_data.get(column)
+            if value is not None and (column not in specs or value != specs[column][row]):
+                return None
+        
+        lower, weight = self.mileage_weights(mileage)
+        curve = self.values[row, year, CAR_CONDITIONS.index(input_data['Condition']),
+                            self.fuels.index(input_data['Fuel_Type']),
+                            self.transmissions.index(input_data['Transmission'])]
+        bands = curve[lower] * (1 - weight) + curve[lower + 1] * weight
+        return {key: int(value) for key, value in zip(PRICE_BAND_COLUMNS.values(), bands)}
+
+    @timed("surface_lookup_batch")
+    def lookup(self, df):
+        """Interpolated PRICE_BAND_COLUMNS frame for a DataFrame of cars, plus the mask of rows on the grid"""
+        rows = SPEC_CATALOG.index.get_indexer(pd.MultiIndex.from_arrays([df['Brand'], df['Model']]))
+        year = df['Year'].to_numpy(dtype=float) - self.years[0]
+        mileage = df['Mileage'].to_numpy(dtype=float)
+        condition = pd.Categorical(df['Condition'], categories=CAR_CONDITIONS).codes
+        fuel = pd.Categorical(df['Fuel_Type'], categories=self.fuels).codes
+        transmission = pd.Categorical(df['Transmission'], categories=self.transmissions).codes
+        
+        covered = ((rows >= 0) & (year >= 0) & (year < len(self.years))
+                   & (mileage >= self.mileage[0]) & (mileage <= self.mileage[-1])
+                   & (condition >= 0) & (fuel >= 0) & (transmission >= 0))
+        for column, specs in [('Engine_cc', SPEC_CATALOG.engine_cc), ('Power_HP', SPEC_CATALOG.power_hp)]:
+            if column in df.columns:
+                covered &= df[column].to_numpy(dtype=float) == specs[rows]
+        specs = self.catalog_context()
+        for column in self.context:
+            if column in df.columns:
+                values = df[column].to_numpy(dtype=object)
+                unknown = pd.isna(values)
+                covered &= unknown | (values == specs[column][rows]) if column in specs else unknown
+        
+        bands = np.zeros((len(df), len(PRICE_BAND_COLUMNS)), dtype=np.int64)
+        if covered.any():
+            lower, weight = self.mileage_weights(mileage[covered])
+            index = (rows[covered], year[covered].astype(np.int64), condition[covered],
+                     fuel[covered], transmission[covered])
+            low_values = self.values[index + (lower,)]
+            high_values = self.values[index + (lower + 1,)]
+            bands[covered] = low_values * (1 - weight[:, None]) + high_values * weight[:, None]
+        return pd.DataFrame(bands, columns=list(PRICE_BAND_COLUMNS), index=df.index), covered
+
+    def catalog_context(self):
+        """Context columns the grid takes from the catalog, as per-catalog-row arrays"""
+        return {'Seats': SPEC_CATALOG.seats, 'Car_Type': np.asarray(SPEC_CATALOG.car_type, dtype=object)}
+
+    def curve(self, input_data):
+        """Price band per grid year for one car with everything else fixed, a depreciation curve
+
+        City, owner, insurance and color are left unknown, so this is the
+        curve of a typical listing of the car.
+        """
+        specs = self.catalog_context()
+        typical = {column: None for column in self.context if column not in specs}
+        cars = pd.DataFrame([{**input_data, **typical, 'Year': year} for year in self.years])
+        bands, covered = self.lookup(cars)
+        return bands[covered].assign(Year=self.years[covered])
+
+# ========================================
+# PREDICTION CACHE
+# ========================================
+
+def normalize_input(input_data):
+    """Copy of a car's inputs with text stripped, price and cache key must both use it"""
+    return {field: value.strip() if isinstance(value, str) else value for field, value in input_data.items()}
+
+def normalize_features(input_data):
+    """Hashable key of normalized model inputs, so 30000 and 30000.0 match"""
+    values = [input_data[feature] for feature in FEATURES] + [input_data.get(feature) for feature in CONTEXT_FEATURES]
+    return tuple(
+        value if isinstance(value, str) else None if value is None else float(value)
+        for value in values
+    )
+
+class PredictionCache:
+    """Thread-safe bounded LRU cache of valuations with hit/miss/eviction counters"""
+
+    def __init__(self, max_size=PREDICTION_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        
+        # Compute outside the lock so slow predictions don't serialize readers
+        value = compute()
+        
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Return cache counters"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+# ========================================
+# MODEL ARTIFACT STORE
+# ========================================
+
+def read_latest_model_version(store_dir=MODEL_STORE_DIR):
+    """Return the latest saved model version, or None if nothing is saved"""
+    try:
+        with open(os.path.join(store_dir, LATEST_MODEL_POINTER)) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    
+    if not os.path.exists(os.path.join(store_dir, version, MODEL_ARTIFACT_NAME)):
+        return None
+    return version
+
+def write_latest_model_version(version, store_dir=MODEL_STORE_DIR):
+    """Atomically point the store at a saved model version"""
+    fd, tmp_path = tempfile.mkstemp(dir=store_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(store_dir, LATEST_MODEL_POINTER))
+
+# ========================================
+# DATA INGESTION
+# ========================================
+
+def file_digest(source):
+    """SHA-256 of a file path or file-like object, leaving the read position unchanged"""
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    else:
+        position = source.tell()
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+        source.seek(position)
+    return digest.hexdigest()
+
+def coerce_csv_numbers(chunk):
+    """Parse a CSV chunk's numeric text columns, unparsable or out-of-range values become NA"""
+    for column, dtype in CSV_NUMERIC_DTYPES.items():
+        if column not in chunk.columns:
+            continue
+        text = chunk[column].astype('str').str.replace(',', '', regex=False).str.strip()
+        values = pd.to_numeric(text, errors='coerce').round()
+        limits = np.iinfo(dtype.lower())
+        chunk[column] = values.where(values.between(limits.min, limits.max)).astype(dtype)
+    return chunk
+
+def concat_chunks(chunks):
+    """Concatenate CSV chunks column by column, keeping categoricals compact"""
+    if not chunks:
+        raise ValueError("CSV file has no data rows")
+    
+    columns = {}
+    for column in list(chunks[0].columns):
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            from pandas.api.types import union_categoricals
+            # Chunks have different categories, plain concat would fall back to object
+            columns[column] = union_categoricals([chunk[column] for chunk in chunks])
+        else:
+            columns[column] = pd.concat([chunk[column] for chunk in chunks], ignore_index=True)
+        # Release each chunk's copy as soon as the column is assembled
+        for chunk in chunks:
+            del chunk[column]
+    
+    return pd.DataFrame(columns)
+
+def write_ingest_cache(df, cache_path):
+    """Atomically write a parsed CSV to the Parquet ingestion cache"""
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# ========================================
+# CONFIDENCE
+# ========================================
+
+def calculate_confidence(input_data, interval=None):
+    """Calculate prediction confidence, from the price band width when one is given"""
+    if interval is not None and interval['median'] > 0:
+        # An 80% band as wide as the price itself means low confidence
+        relative_width = (interval['high'] - interval['low']) / interval['median']
+        return int(min(95, max(60, round(100 - 40 * relative_width))))
+    
+    confidence = 80
+    
+    # Increase confidence for newer cars
+    current_year = datetime.now().year
+    if current_year - input_data['Year'] <= 5:
+        confidence += 10
+    
+    # Decrease confidence for high mileage
+    if input_data['Mileage'] > 100000:
+        confidence -= 10
+    
+    return min(95, max(60, confidence))
@@ -0,0 +1,262 @@
+# ======================================================
+# SMART CAR PRICING SYSTEM - HEADLESS HTTP PRICING SERVICE
+# ======================================================
+#
+# Run with:  python pricing_service.py --port 8080 --workers 8
+#
+#   GET  /health    -> model status
+#   GET  /metrics   -> stage timings and counters, Prometheus text format
+#   POST /predict   -> {"Brand": ..., "Model": ..., ...}        single car
+#                   -> {"cars": [{"Brand": ..., ...}, ...]}    batch, "intervals": true adds bands
+
+import argparse
+import asyncio
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from instrumentation import METRICS
+from pricing_core import (
+    CarPricePredictor, PredictionCache, normalize_features, normalize_input,
+    read_latest_model_version, MODEL_STORE_DIR, PREDICTION_CACHE_SIZE,
+    FEATURES, CATEGORICAL_FEATURES, NUMERICAL_FEATURES, CAR_CONDITIONS
+)
+
+MAX_BODY_BYTES = 50 * 1024 * 1024
+MAX_BATCH_SIZE = 100000
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error"
+}
+
+# ========================================
+# REQUEST VALIDATION
+# ========================================
+
+def coerce_car(car, label="car"):
+    """Check a requested car's fields, numbers sent as strings are converted, raises ValueError"""
+    if not isinstance(car, dict):
+        raise ValueError(f"{label} must be a JSON object")
+    missing = [field for field in FEATURES if car.get(field) is None]
+    if missing:
+        raise ValueError(f"{label}: missing fields {missing}")
+    
+    # Stripped once, so the cache key and the price see the same values
+    car = normalize_input(car)
+    for field in CATEGORICAL_FEATURES:
+        value = car.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{label}: '{field}' must be a string")
+    for field in NUMERICAL_FEATURES:
+        value = car.get(field)
+        if value is None:
+            continue
+        try:
+            if isinstance(value, bool):
+                raise ValueError
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{label}: '{field}' must be a number")
+        if not math.isfinite(number):
+            raise ValueError(f"{label}: '{field}' must be a finite number")
+        car[field] = int(number) if number.is_integer() else number
+    if car['Condition'] not in CAR_CONDITIONS:
+        raise ValueError(f"{label}: unknown Condition '{car['Condition']}', expected one of {CAR_CONDITIONS}")
+    return car
+
+# ========================================
+# PRICING SERVICE
+# ========================================
+
+class PricingService:
+    """Serves CarPricePredictor valuations from a worker pool"""
+
+    def __init__(self, predictor, workers=os.cpu_count()):
+        self.predictor = predictor
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pricing")
+        self.cache = PredictionCache(PREDICTION_CACHE_SIZE)
+
+    @classmethod
+    def from_store(cls, store_dir=MODEL_STORE_DIR, workers=os.cpu_count(), compact=False):
+        """Load the latest saved model once, or use the fallback model if none is saved"""
+        if read_latest_model_version(store_dir) is not None:
+            predictor = CarPricePredictor.load_model(store_dir=store_dir)
+            if compact and predictor.backend == "random_forest" and not predictor.is_compact:
+                # Keeps the saved version, unpruned compaction prices the same
+                version = predictor.model_version
+                stats = predictor.compact_model()
+                predictor.model_version = version
+                print(f"🗜️ Compacted model: {stats['bytes_before'] / 1e6:.1f} MB → {stats['bytes_after'] / 1e6:.1f} MB")
+        else:
+            predictor = CarPricePredictor()
+        return cls(predictor, workers)
+
+    def predict_one(self, car):
+        """Price one car with the same semantics as the Streamlit prediction page"""
+        car = coerce_car(car)
+        key = (self.predictor.cache_token(), normalize_features(car))
+        valuation = self.cache.get_or_compute(key, lambda: self.predictor.valuation(car))
+        return {
+            'predicted_price': valuation['price'],
+            'price_low': valuation['low'],
+            'price_median': valuation['median'],
+            'price_high': valuation['high'],
+            'confidence': valuation['confidence'],
+            'model_version': self.predictor.model_version
+        }
+
+    def predict_many(self, cars, intervals=False):
+        """Price a batch of cars in one vectorized call"""
+        cars = [coerce_car(car, f"cars[{index}]") for index, car in enumerate(cars)]
+        prices = self.predictor.predict_batch(pd.DataFrame(cars), return_interval=intervals)
+        if intervals:
+            return {
+                'predicted_prices': prices['Predicted_Price'].tolist(),
+                'price_low': prices['Price_Low'].tolist(),
+                'price_median': prices['Price_Median'].tolist(),
+                'price_high': prices['Price_High'].tolist(),
+                'model_version': self.predictor.model_version
+            }
+        return {
+            'predicted_prices': [int(price) for price in prices],
+            'model_version': self.predictor.model_version
+        }
+
+    def health(self):
+        """Return model status"""
+        return {
+            'status': "ok",
+            'trained': self.predictor.is_trained,
+            'model_version': self.predictor.model_version,
+            'cache': self.cache.stats()
+        }
+
+    async def dispatch(self, method, path, body):
+        """Route a request, returns (status, payload)"""
+        METRICS.increment("http_requests_total")
+        if path == "/health":
+            if method != "GET":
+                return 405, {'error': "Use GET"}
+            return 200, self.health()
+        
+        if path == "/metrics":
+            if method != "GET":
+                return 405, {'error': "Use GET"}
+            return 200, METRICS.to_prometheus()
+
+        if path != "/predict":
+            return 404, {'error': f"Unknown path {path}"}
+        if method != "POST":
+            return 405, {'error': "Use POST"}
+
+        try:
+            request = json.loads(body)
+        except ValueError as e:
+            return 400, {'error': f"Invalid JSON: {str(e)}"}
+        if not isinstance(request, dict):
+            return 400, {'error': "Request body must be a JSON object"}
+
+        loop = asyncio.get_running_loop()
+        try:
+            if 'cars' in request:
+                cars = request['cars']
+                if not isinstance(cars, list) or len(cars) > MAX_BATCH_SIZE:
+                    return 400, {'error': f"'cars' must be a list of at most {MAX_BATCH_SIZE} cars"}
+                intervals = bool(request.get('intervals', False))
+                return 200, await loop.run_in_executor(self.pool, self.predict_many, cars, intervals)
+            return 200, await loop.run_in_executor(self.pool, self.predict_one, request)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': str(e)}
+
+# ========================================
+# HTTP SERVER
+# ========================================
+
+async def handle_connection(service, reader, writer):
+    """Serve HTTP/1.1 requests on one connection, with keep-alive"""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, version = request_line.decode('latin-1').split()
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY_BYTES:
+                await write_response(writer, 413, {'error': "Request body too large"}, keep_alive=False)
+                break
+            body = await reader.readexactly(length) if length else b''
+
+            status, payload = await service.dispatch(method, path.split('?')[0], body)
+            keep_alive = version == "HTTP/1.1" and headers.get('connection', '').lower() != "close"
+            await write_response(writer, status, payload, keep_alive)
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def write_response(writer, status, payload, keep_alive):
+    """Write a JSON response, or plain text for string payloads"""
+    if isinstance(payload, str):
+        body = payload.encode('utf-8')
+        content_type = "text/plain; version=0.0.4"
+    else:
+        body = json.dumps(payload).encode('utf-8')
+        content_type = "application/json"
+    head = (
+        f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+
+async def serve(service, host, port):
+    """Run the HTTP server until cancelled"""
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(service, reader, writer), host, port
+    )
+    print(f"🚗 Pricing service on http://{host}:{port} "
+          f"(model: {service.predictor.model_version or 'fallback'})")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless car pricing HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--model-dir", default=MODEL_STORE_DIR)
+    parser.add_argument("--compact", action="store_true",
+                        help="flatten a random forest into compact arrays on startup, less memory per replica")
+    args = parser.parse_args()
+
+    service = PricingService.from_store(args.model_dir, args.workers, compact=args.compact)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()